@@ -2,133 +2,166 @@
 Modern Streamlit frontend for Cligue - Visual Understanding Chat Assistant.
 Generic, attractive, and well-structured UI for any type of video content.
 """
+import asyncio
+import time
 import streamlit as st
-import requests
-import tempfile
+import httpx
 import os
-from datetime import datetime
-import time
 
 # API Configuration
 API_URL = "http://127.0.0.1:8000"
+STYLES_PATH = os.path.join(os.path.dirname(__file__), "styles.css")
 
-# Custom CSS for modern styling
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-    }
-    
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin: 0.5rem 0;
-    }
-    
-    .highlight-box {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
-    }
-    
-    .event-card {
-        background: #f8f9fa;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #667eea;
-        margin: 0.5rem 0;
-    }
-    
-    .chat-container {
-        background: #f8f9fa;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-    
-    .upload-area {
-        border: 2px dashed #667eea;
-        border-radius: 10px;
-        padding: 2rem;
-        text-align: center;
-        background: #f8f9fa;
-        margin: 1rem 0;
-    }
-    
-    .suggestion-button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        padding: 0.5rem 1rem;
-        border-radius: 20px;
-        margin: 0.25rem;
-        cursor: pointer;
-    }
-    
-    .status-indicator {
-        display: inline-block;
-        width: 10px;
-        height: 10px;
-        border-radius: 50%;
-        margin-right: 0.5rem;
-    }
-    
-    .status-online { background-color: #28a745; }
-    .status-offline { background-color: #dc3545; }
-</style>
-""", unsafe_allow_html=True)
 
+@st.cache_data(show_spinner=False)
+def load_styles():
+    """Read the stylesheet once per process instead of on every rerun."""
+    with open(STYLES_PATH, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+def metric_card(title, value, value_tag="h2"):
+    """Build the HTML for one metric tile."""
+    return f'<div class="metric-card"><h3>{title}</h3><{value_tag}>{value}</{value_tag}></div>'
+
+
+def render_metric_cards(cards):
+    """Render a row of metric tiles with a single markdown element."""
+    st.markdown(f'<div class="metric-grid">{"".join(cards)}</div>', unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_http_client():
+    """Shared HTTP client so keep-alive connections survive Streamlit reruns."""
+    return httpx.Client(
+        base_url=API_URL,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=4)
+    )
 
+
+@st.cache_data(ttl=5, show_spinner=False)
 def check_api_status():
     """Check if the API is available."""
     try:
-        response = requests.get(f"{API_URL}/health", timeout=5)
+        response = get_http_client().get("/health", timeout=5)
         return response.status_code == 200
-    except:
+    except httpx.HTTPError:
         return False
 
 
-def upload_video(video_path):
+@st.cache_data(ttl=5, show_spinner=False)
+def get_status(session_id=None):
+    """Get the current analysis status from the backend."""
+    params = {"session_id": session_id} if session_id else None
+    try:
+        response = get_http_client().get("/status", params=params, timeout=5)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError:
+        return None
+
+
+async def fetch_system_status(session_id=None):
+    """Fetch API health and analysis status concurrently."""
+    return await asyncio.gather(
+        asyncio.to_thread(check_api_status),
+        asyncio.to_thread(get_status, session_id)
+    )
+
+
+class UploadProgressReader:
+    """Wraps an uploaded file and reports the fraction read while httpx streams it."""
+
+    def __init__(self, file, total_size, on_progress):
+        self._file = file
+        self._total_size = max(total_size, 1)
+        self._on_progress = on_progress
+
+    def read(self, size=-1):
+        chunk = self._file.read(size)
+        self._on_progress(min(self._file.tell() / self._total_size, 1.0))
+        return chunk
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+
+def upload_video(uploaded_file, on_progress=None):
     """Upload video to the backend for analysis."""
-    with open(video_path, "rb") as f:
-        files = {"file": ("video.mp4", f, "video/mp4")}
+    # Pass the file object itself so httpx streams it instead of copying it into the request
+    uploaded_file.seek(0)
+    body = UploadProgressReader(uploaded_file, uploaded_file.size, on_progress) if on_progress else uploaded_file
+    files = {"file": (uploaded_file.name, body, uploaded_file.type or "video/mp4")}
+    try:
+        response = get_http_client().post("/upload_video", files=files, timeout=120)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error uploading video: {e}")
+        return None
+
+
+def wait_for_analysis(session_id, on_progress=None, poll_interval=1.0):
+    """Poll the backend until the video's analysis finishes; returns the final status."""
+    while True:
         try:
-            response = requests.post(f"{API_URL}/upload_video", files=files, timeout=600)
+            response = get_http_client().get(f"/status/{session_id}", timeout=5)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error uploading video: {e}")
+            status = response.json()
+        except httpx.HTTPError as e:
+            st.error(f"Error checking analysis progress: {e}")
             return None
+        if on_progress:
+            on_progress(status["progress"])
+        if status["analysis_status"] != "processing":
+            return status
+        time.sleep(poll_interval)
 
 
-def send_chat_message(message):
-    """Send a chat message to the backend."""
-    try:
-        response = requests.post(f"{API_URL}/chat", json={"message": message})
+def stream_chat_message(session_id, message):
+    """Yield the assistant's reply from the backend as it is generated."""
+    with get_http_client().stream(
+        "POST",
+        "/chat_stream",
+        json={"session_id": session_id, "message": message},
+        timeout=httpx.Timeout(30.0, read=None)  # The first token can take a while on CPU
+    ) as response:
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error sending message: {e}")
-        return None
+        yield from response.iter_text()
+
 
+def ask_assistant(session_id, question):
+    """Show the question in the chat and stream the assistant's answer below it."""
+    st.session_state.messages.append({"role": "user", "content": question})
+    with st.chat_message("user"):
+        st.markdown(question)
+    
+    with st.chat_message("assistant"):
+        try:
+            response_text = st.write_stream(stream_chat_message(session_id, question))
+        except httpx.HTTPError as e:
+            st.error(f"❌ Failed to get a response from the assistant: {e}")
+            return
+    st.session_state.messages.append({"role": "assistant", "content": response_text})
 
-def get_analysis_data():
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_analysis(session_id):
+    """Fetch the analysis for one uploaded video; cached per session_id."""
+    response = get_http_client().get("/analysis", params={"session_id": session_id})
+    response.raise_for_status()
+    return response.json()
+
+
+def get_analysis_data(session_id):
     """Get complete analysis data."""
     try:
-        response = requests.get(f"{API_URL}/analysis")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return fetch_analysis(session_id)
+    except httpx.HTTPError as e:
         st.error(f"Error getting analysis: {e}")
         return None
 
@@ -141,6 +174,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Custom CSS for modern styling (must be re-emitted on every rerun to stay applied)
+st.markdown(load_styles(), unsafe_allow_html=True)
+
 # Header
 st.markdown("""
 <div class="main-header">
@@ -156,6 +192,8 @@ if "analysis_complete" not in st.session_state:
     st.session_state.analysis_complete = False
 if "analysis_data" not in st.session_state:
     st.session_state.analysis_data = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
 if "upload_progress" not in st.session_state:
     st.session_state.upload_progress = 0
 
@@ -164,11 +202,16 @@ with st.sidebar:
     st.markdown("### 🔧 System Status")
     
     # API Status
-    api_status = check_api_status()
+    api_status, system_status = asyncio.run(fetch_system_status(st.session_state.session_id))
     status_color = "🟢" if api_status else "🔴"
     status_text = "Online" if api_status else "Offline"
     st.markdown(f"{status_color} API Server: **{status_text}**")
     
+    if system_status:
+        vlm_color = "🟢" if system_status.get("vlm_available") else "🔴"
+        vlm_text = "Ready" if system_status.get("vlm_available") else "Not loaded"
+        st.markdown(f"{vlm_color} VLM: **{vlm_text}**")
+    
     if not api_status:
         st.warning("⚠️ Please ensure the API server is running on port 8000")
     
@@ -185,49 +228,53 @@ with st.sidebar:
     
     if uploaded_file is not None:
         # File info
-        file_size = len(uploaded_file.getvalue()) / (1024 * 1024)  # MB
+        file_size = uploaded_file.size / (1024 * 1024)  # MB
         st.info(f"📄 File: {uploaded_file.name}\n💾 Size: {file_size:.1f} MB")
         
         if st.button("🔍 Analyze Video", type="primary", use_container_width=True):
             if not api_status:
                 st.error("❌ API server is not available")
             else:
-                with st.spinner("🔄 Analyzing video... This may take a few minutes."):
-                    # Progress bar
+                with st.status("📤 Uploading video...", expanded=True) as upload_status:
                     progress_bar = st.progress(0)
-                    status_text = st.empty()
                     
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-                        tmp.write(uploaded_file.getvalue())
-                        video_path = tmp.name
+                    def show_progress(fraction):
+                        percent = int(fraction * 100)
+                        if percent == st.session_state.upload_progress:
+                            return
+                        st.session_state.upload_progress = percent
+                        progress_bar.progress(percent)
                     
-                    # Simulate progress
-                    for i in range(100):
-                        time.sleep(0.05)
-                        progress_bar.progress(i + 1)
-                        if i < 30:
-                            status_text.text("📤 Uploading video...")
-                        elif i < 70:
-                            status_text.text("🔍 Processing frames...")
-                        else:
-                            status_text.text("🤖 Analyzing with AI...")
+                    st.session_state.upload_progress = 0
+                    upload_result = upload_video(uploaded_file, show_progress)
                     
-                    analysis_result = upload_video(video_path)
-                    os.unlink(video_path)
+                    analysis_result = None
+                    if upload_result:
+                        session_id = upload_result["session_id"]
+                        upload_status.update(label="🤖 Analyzing frames with AI... This may take a few minutes.")
+                        st.session_state.upload_progress = 0
+                        progress_bar.progress(0)
+                        job = wait_for_analysis(session_id, show_progress)
+                        if job and job["analysis_status"] == "failed":
+                            st.error(f"❌ {job.get('error') or 'Video analysis failed'}")
+                        elif job:
+                            analysis_result = get_analysis_data(session_id)
                     
                     if analysis_result:
                         st.session_state.analysis_complete = True
                         st.session_state.analysis_data = analysis_result
+                        st.session_state.session_id = session_id
+                        get_status.clear()
                         st.session_state.messages = [
                             {
                                 "role": "assistant",
                                 "content": "✅ Video analysis complete! I can help you understand what happened in the video. Ask me anything about it!"
                             }
                         ]
-                        st.success("🎉 Analysis Complete!")
+                        upload_status.update(label="🎉 Analysis Complete!", state="complete", expanded=False)
                         st.balloons()
                     else:
-                        st.error("❌ Failed to analyze video. Please try again.")
+                        upload_status.update(label="❌ Failed to analyze video. Please try again.", state="error")
 
 # Main Content
 if st.session_state.analysis_complete and st.session_state.analysis_data:
@@ -237,41 +284,12 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     # Key Metrics
     stats = st.session_state.analysis_data.get("statistics", {})
     if stats:
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>📈 Total Events</h3>
-                <h2>{stats.get('total_events', 0)}</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>⚡ Events/Min</h3>
-                <h2>{stats.get('events_per_minute', 0):.1f}</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>⏱️ Duration</h3>
-                <h2>{stats.get('duration_minutes', 0):.1f} min</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
-            event_types = stats.get('event_types', {})
-            total_types = len(event_types)
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>🏷️ Event Types</h3>
-                <h2>{total_types}</h2>
-            </div>
-            """, unsafe_allow_html=True)
+        render_metric_cards([
+            metric_card("📈 Total Events", stats.get('total_events', 0)),
+            metric_card("⚡ Events/Min", f"{stats.get('events_per_minute', 0):.1f}"),
+            metric_card("⏱️ Duration", f"{stats.get('duration_minutes', 0):.1f} min"),
+            metric_card("🏷️ Event Types", len(stats.get('event_types', {})))
+        ])
     
     # Content Layout
     col1, col2 = st.columns([2, 1])
@@ -279,7 +297,7 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     with col1:
         # Summary Section
         st.markdown("### 📝 Summary")
-        summary = st.session_state.analysis_data.get("summary", "No summary available.")
+        summary = st.session_state.analysis_data.get("overview", "No summary available.")
         st.markdown(f"""
         <div class="highlight-box">
             {summary}
@@ -328,19 +346,7 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     
     # Chat input
     if prompt := st.chat_input("Ask about the video..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        
-        with st.spinner("🤔 Thinking..."):
-            chat_response = send_chat_message(prompt)
-            if chat_response:
-                response_text = chat_response.get("response", "Sorry, I couldn't get a response.")
-                st.session_state.messages.append({"role": "assistant", "content": response_text})
-                with st.chat_message("assistant"):
-                    st.markdown(response_text)
-            else:
-                st.error("❌ Failed to get a response from the assistant.")
+        ask_assistant(st.session_state.session_id, prompt)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -359,17 +365,7 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     for i, suggestion in enumerate(suggestions):
         with cols[i % 3]:
             if st.button(suggestion, key=f"suggest_{i}"):
-                st.session_state.messages.append({"role": "user", "content": suggestion})
-                with st.chat_message("user"):
-                    st.markdown(suggestion)
-                
-                with st.spinner("🤔 Thinking..."):
-                    chat_response = send_chat_message(suggestion)
-                    if chat_response:
-                        response_text = chat_response.get("response", "Sorry, I couldn't get a response.")
-                        st.session_state.messages.append({"role": "assistant", "content": response_text})
-                        with st.chat_message("assistant"):
-                            st.markdown(response_text)
+                ask_assistant(st.session_state.session_id, suggestion)
 
 else:
     # Welcome Screen
@@ -405,28 +401,8 @@ else:
     
     # Features
     st.markdown("### ✨ Features")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>🎯 Universal Analysis</h3>
-            <p>Works with any video type</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>🤖 AI-Powered</h3>
-            <p>Advanced vision-language model</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>💬 Natural Chat</h3>
-            <p>Conversational AI interface</p>
-        </div>
-        """, unsafe_allow_html=True)
+    render_metric_cards([
+        metric_card("🎯 Universal Analysis", "Works with any video type", "p"),
+        metric_card("🤖 AI-Powered", "Advanced vision-language model", "p"),
+        metric_card("💬 Natural Chat", "Conversational AI interface", "p")
+    ])
@@ -2,66 +2,20 @@
 Conversational agent for analyzing video events and summaries.
 Generic implementation for any type of video content.
 """
-from typing import List, Dict, Any
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Dict, Any
 from src.core.event_detector import DetectedEvent
 from src.utils.helpers import format_timestamp
 from src.agents.memory_manager import MemoryManager
 from src.core.vlm_interface import VLMInterface
 
 
-class VideoAnalysisAgent:
-    def __init__(self, events: List[DetectedEvent], summary: Dict[str, Any], vlm_interface: VLMInterface):
-        self.events = events
-        self.summary = summary
-        self.memory = MemoryManager()
-        self.vlm = vlm_interface
-        self._initial_context = self._create_initial_context()
-        self.memory.add_message("system", self._initial_context)
-
-    def _create_initial_context(self) -> str:
-        """Creates the initial system prompt with a summary of the video analysis."""
-        context = """You are an intelligent video analysis assistant. You have analyzed a video and detected various events, objects, and activities. Your role is to help users understand the video content through natural conversation.
+CONTEXT_INTRO = """You are an intelligent video analysis assistant. You have analyzed a video and detected various events, objects, and activities. Your role is to help users understand the video content through natural conversation.
 
 ANALYSIS CONTEXT:
 """
-        
-        # Add video overview
-        context += "VIDEO OVERVIEW:\n"
-        context += self.summary.get("overview", "No summary available.")
-        context += "\n\n"
-        
-        # Add statistics
-        stats = self.summary.get("statistics", {})
-        if stats:
-            context += f"VIDEO STATISTICS:\n"
-            context += f"- Total events detected: {stats.get('total_events', 0)}\n"
-            context += f"- Events per minute: {stats.get('events_per_minute', 0):.1f}\n"
-            context += f"- Video duration: {stats.get('duration_minutes', 0):.1f} minutes\n"
-            context += "\n"
-        
-        # Add key highlights
-        context += "KEY HIGHLIGHTS:\n"
-        context += self._format_highlights_for_prompt()
-        context += "\n\n"
-        
-        # Add timeline
-        context += "TIMELINE OF EVENTS:\n"
-        context += self._format_timeline_for_prompt()
-        context += "\n\n"
-        
-        # Add events by type
-        context += "EVENTS BY CATEGORY:\n"
-        context += self._format_events_by_type_for_prompt()
-        context += "\n\n"
-        
-        # Add detailed event information
-        if self.events:
-            context += "DETAILED EVENT ANALYSIS:\n"
-            for i, event in enumerate(self.events[:15], 1):  # Show first 15 events
-                context += f"{i}. {event.description} (Type: {event.event_type.value}, Severity: {event.severity}, Time: {format_timestamp(event.timestamp)})\n"
-            context += "\n"
-        
-        context += """RESPONSE GUIDELINES:
+
+CONTEXT_GUIDELINES = """RESPONSE GUIDELINES:
 - Be specific and reference actual events, timestamps, and details from the analysis
 - Provide clear, concise explanations
 - If asked about something not in the analysis, acknowledge this clearly
@@ -81,8 +35,64 @@ CAPABILITIES:
 - Provide context and explanations
 
 Remember: Always base your responses on the actual analysis data provided. If you're uncertain about something, say so clearly."""
+
+
+class VideoAnalysisAgent:
+    def __init__(self, events: List[DetectedEvent], summary: Dict[str, Any], vlm_interface: VLMInterface):
+        self.events = events
+        self.summary = summary
+        self.memory = MemoryManager()
+        self.vlm = vlm_interface
+        # Events sorted by time so range searches can bisect instead of scanning,
+        # with their dict views built once and shared by the search helpers
+        events_by_time = sorted(self.events, key=lambda e: e.timestamp)
+        self._timestamps = [event.timestamp for event in events_by_time]
+        self._event_dicts = [event.to_dict() for event in events_by_time]
+        self._high_severity_events = [
+            event for event in self._event_dicts if event["severity"].lower() == "high"
+        ]
+        self._by_type = self.summary.get("events_by_type", {})
+        self._initial_context = self._create_initial_context()
+        self.memory.add_message("system", self._initial_context)
+
+    def _create_initial_context(self) -> str:
+        """Creates the initial system prompt with a summary of the video analysis."""
+        parts: List[str] = [CONTEXT_INTRO]
+        
+        # Add video overview
+        parts.append("VIDEO OVERVIEW:\n")
+        parts.append(self.summary.get("overview", "No summary available."))
+        parts.append("\n\n")
+        
+        # Add statistics
+        stats = self.summary.get("statistics", {})
+        if stats:
+            parts.append(
+                "VIDEO STATISTICS:\n"
+                f"- Total events detected: {stats.get('total_events', 0)}\n"
+                f"- Events per minute: {stats.get('events_per_minute', 0):.1f}\n"
+                f"- Video duration: {stats.get('duration_minutes', 0):.1f} minutes\n"
+                "\n"
+            )
+        
+        # Add key highlights, timeline and events by type
+        parts.extend((
+            "KEY HIGHLIGHTS:\n", self._format_highlights_for_prompt(), "\n\n",
+            "TIMELINE OF EVENTS:\n", self._format_timeline_for_prompt(), "\n\n",
+            "EVENTS BY CATEGORY:\n", self._format_events_by_type_for_prompt(), "\n\n",
+        ))
         
-        return context
+        # Add detailed event information
+        if self.events:
+            parts.append("DETAILED EVENT ANALYSIS:\n")
+            parts.append("".join([
+                f"{i}. {event.description} (Type: {event.event_type.value}, Severity: {event.severity}, Time: {format_timestamp(event.timestamp)})\n"
+                for i, event in enumerate(self.events[:15], 1)  # Show first 15 events
+            ]))
+            parts.append("\n")
+        
+        parts.append(CONTEXT_GUIDELINES)
+        return "".join(parts)
 
     def chat(self, user_input: str) -> str:
         """Handle user chat input with context from memory."""
@@ -95,16 +105,25 @@ Remember: Always base your responses on the actual analysis data provided. If yo
         self.memory.add_message("assistant", response)
         return response
 
+    def chat_stream(self, user_input: str) -> Iterator[str]:
+        """Handle user chat input, yielding the response as it is generated."""
+        self.memory.add_message("user", user_input)
+        messages = self.memory.get_history()
+        
+        parts = []
+        for part in self.vlm.chat_with_context_stream(messages):
+            parts.append(part)
+            yield part
+        
+        self.memory.add_message("assistant", "".join(parts))
+
     def _format_highlights_for_prompt(self) -> str:
         """Formats the highlights list for the initial system prompt."""
         highlights = self.summary.get("key_highlights", [])
         if not highlights:
             return "No highlights available."
         
-        formatted_list = []
-        for i, highlight in enumerate(highlights, 1):
-            formatted_list.append(f"{i}. {highlight}")
-        return "\n".join(formatted_list)
+        return "\n".join(f"{i}. {highlight}" for i, highlight in enumerate(highlights, 1))
 
     def _format_timeline_for_prompt(self) -> str:
         """Formats the timeline for the initial system prompt."""
@@ -112,19 +131,18 @@ Remember: Always base your responses on the actual analysis data provided. If yo
         if not timeline:
             return "No timeline available."
 
-        formatted_list = []
-        for item in timeline:
-            formatted_list.append(f"- {item['time']}: {item['event']} ({item['type']})")
-        return "\n".join(formatted_list)
+        return "\n".join(
+            f"- {item['time']}: {item['event']}" + (f" ({item['type']})" if item.get('type') else "")
+            for item in timeline
+        )
 
     def _format_events_by_type_for_prompt(self) -> str:
         """Formats the events by type for the initial system prompt."""
-        events_by_type = self.summary.get("events_by_type", {})
-        if not events_by_type:
+        if not self._by_type:
             return "No events categorized."
         
         formatted_list = []
-        for event_type, events in events_by_type.items():
+        for event_type, events in self._by_type.items():
             formatted_list.append(f"{event_type.replace('_', ' ').title()}:")
             for event in events[:5]:  # Show first 5 events per type
                 formatted_list.append(f"  • {event['description']} at {event['timestamp']}")
@@ -135,34 +153,20 @@ Remember: Always base your responses on the actual analysis data provided. If yo
         return self.summary.get("statistics", {})
 
     def search_events_by_type(self, event_type: str) -> List[Dict[str, Any]]:
-        """Search for events of a specific type."""
-        events_by_type = self.summary.get("events_by_type", {})
-        return events_by_type.get(event_type, [])
+        """Search for events of a specific type (case-insensitive)."""
+        events = self._by_type.get(event_type)
+        if events is not None:
+            return events
+        # Only a differently cased name needs the scan; nothing is indexed up front
+        event_type = event_type.lower()
+        return next((events for name, events in self._by_type.items() if name.lower() == event_type), [])
 
     def search_events_by_time_range(self, start_time: float, end_time: float) -> List[Dict[str, Any]]:
         """Search for events within a specific time range."""
-        matching_events = []
-        for event in self.events:
-            if start_time <= event.timestamp <= end_time:
-                matching_events.append({
-                    "timestamp": format_timestamp(event.timestamp),
-                    "type": event.event_type.value,
-                    "description": event.description,
-                    "severity": event.severity,
-                    "objects": event.objects_involved
-                })
-        return matching_events
+        lo = bisect_left(self._timestamps, start_time)
+        hi = bisect_right(self._timestamps, end_time)
+        return self._event_dicts[lo:hi]
 
     def get_high_severity_events(self) -> List[Dict[str, Any]]:
         """Get events with high severity."""
-        high_severity = []
-        for event in self.events:
-            if event.severity.lower() == "high":
-                high_severity.append({
-                    "timestamp": format_timestamp(event.timestamp),
-                    "type": event.event_type.value,
-                    "description": event.description,
-                    "severity": event.severity,
-                    "objects": event.objects_involved
-                })
-        return high_severity
+        return list(self._high_severity_events)
@@ -1,7 +1,8 @@
 """
 Context and conversation memory management.
 """
-from typing import List, Dict
+from collections import deque
+from typing import Deque, List, Dict
 from src.utils.config import AGENT_MEMORY_K
 
 
@@ -10,7 +11,8 @@ class MemoryManager:
 
     def __init__(self, k: int = AGENT_MEMORY_K):
         self.k = k
-        self.history: List[Dict[str, str]] = []
+        # k pairs of user/assistant messages; older messages are evicted automatically
+        self.history: Deque[Dict[str, str]] = deque(maxlen=self.k * 2)
 
     def add_message(self, role: str, content: str):
         """Adds a message to the history."""
@@ -18,8 +20,8 @@ class MemoryManager:
 
     def get_history(self) -> List[Dict[str, str]]:
         """Retrieves the last k messages from the history."""
-        return self.history[-self.k * 2:]  # k pairs of user/assistant messages
+        return list(self.history)
 
     def clear(self):
         """Clears the conversation history."""
-        self.history = []
+        self.history.clear()
@@ -1,221 +1,382 @@
 """
 FastAPI backend for the Visual Understanding Chat Assistant.
 """
+import asyncio
+import itertools
+import math
 import tempfile
 import os
 import logging
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import threading
+import aiofiles
+import orjson
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Callable, Iterable, List, Optional
 import uvicorn
 
-from src.core.video_processor import VideoProcessor
+from src.core.video_processor import VideoProcessor, VideoFrame
 from src.core.vlm_interface import VLMInterface
-from src.core.event_detector import EventDetector
+from src.core.vlm_cache import PromptCache
+from src.core.event_detector import EventDetector, DetectedEvent
 from src.core.summarizer import VideoSummarizer
 from src.agents.chat_agent import VideoAnalysisAgent
-from src.api.models import UploadResponse, ChatRequest, ChatResponse, ChatMessage, StatusResponse, VideoStatistics
+from src.api.models import UploadResponse, ChatRequest, ChatResponse, ChatMessage, StatusResponse
+from src.api.responses import ORJSONResponse, MsgspecJSONResponse
+from src.api.sessions import SessionLimitReached, SessionStore, SessionState
+from src.utils.config import (
+    UPLOAD_CHUNK_SIZE, MAX_SESSIONS, FPS_SAMPLE_RATE, MAX_FRAMES_PER_VIDEO, FRAME_BATCH_SIZE,
+    FRAME_MICRO_BATCH_SIZE, FRAME_MICRO_BATCH_TIMEOUT
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Cligue - Visual Understanding Chat Assistant")
 
-# Global state (in-memory for hackathon)
-analysis_state: Dict[str, Any] = {
-    "agent": None,
-    "events": [],
-    "summary": {},
-    "vlm_available": False,
-}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared components once at startup."""
+    logger.info("Initializing VLM interface...")
+    app.state.vlm = VLMInterface()
+    app.state.prompt_cache = PromptCache()
+    # Frame decoding gets its own threads so it never queues behind VLM and summarization work
+    # in the default executor; one thread per concurrently processed video
+    app.state.decode_executor = ThreadPoolExecutor(max_workers=MAX_SESSIONS, thread_name_prefix="frame-decode")
+    # Warm the model in the background so startup isn't held up by model loading
+    app.state.warm_up = asyncio.create_task(asyncio.to_thread(EventDetector(app.state.vlm).warm_up))
+    yield
+    app.state.decode_executor.shutdown(wait=False, cancel_futures=True)
+    await app.state.vlm.aclose()
+    app.state.prompt_cache.close()
+
+
+app = FastAPI(title="Cligue - Visual Understanding Chat Assistant", lifespan=lifespan)
+
+# Analysis state per uploaded video (in-memory for hackathon)
+sessions = SessionStore()
+
+def get_session(session_id: str) -> SessionState:
+    """Look up a session whose analysis has completed, or fail with 404/409"""
+    state = sessions.get(session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown session. Please upload a video first.")
+    if state.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Video analysis failed: {state.error}")
+    if state.agent is None:
+        raise HTTPException(status_code=409, detail="Video analysis is still in progress.")
+    return state
+
+
+async def detect_events(event_detector: EventDetector, frames: Iterable[VideoFrame],
+                        batch_size: int = FRAME_MICRO_BATCH_SIZE,
+                        batch_timeout: float = FRAME_MICRO_BATCH_TIMEOUT,
+                        images_per_request: int = FRAME_BATCH_SIZE,
+                        on_progress: Optional[Callable[[int], None]] = None,
+                        executor: Optional[ThreadPoolExecutor] = None) -> List[DetectedEvent]:
+    """
+    Run event detection while frames are still being decoded.
+    A producer thread feeds decoded frames into a queue; they are grouped into micro-batches of up to
+    batch_size, flushed early after batch_timeout seconds, and each batch is analyzed concurrently.
+    on_progress, if given, is called with the number of frames in each finished batch.
+    The producer runs on executor, or the default executor if None.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Optional[VideoFrame]]" = asyncio.Queue(maxsize=batch_size)
+    # At most two batches' worth of decoded frames wait on or run through the VLM at once
+    frames_in_flight = asyncio.Semaphore(2 * batch_size)
+    # Set once the consumer stops, so a producer blocked on the full queue gives up instead of hanging
+    stopped = threading.Event()
+
+    def put(item: Optional[VideoFrame]) -> bool:
+        """Queue an item from the producer thread; returns False if the consumer has stopped"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except FutureTimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+        finally:
+            if not stopped.is_set():
+                put(None)
+
+    async def detect(batch: List[VideoFrame]) -> List[DetectedEvent]:
+        frame_range = f"{batch[0].frame_number}-{batch[-1].frame_number}"
+        try:
+            batch_events = await event_detector.detect_events_in_frames(batch, images_per_request)
+            logger.info(f"Processed frames {frame_range}, found {len(batch_events)} events")
+            return batch_events
+        except Exception as e:
+            logger.error(f"Error processing frames {frame_range}: {e}")
+            return []
+        finally:
+            for _ in batch:
+                frames_in_flight.release()
+            if on_progress:
+                on_progress(len(batch))
+
+    producer = loop.run_in_executor(executor, produce)
+    tasks = []
+    try:
+        end_of_stream = False
+        while not end_of_stream:
+            batch: List[VideoFrame] = []
+            deadline = None
+            while len(batch) < batch_size:
+                if batch and frames_in_flight.locked():
+                    break  # Dispatch what we have rather than wait for a slot
+                await frames_in_flight.acquire()
+                try:
+                    timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                    frame = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    frames_in_flight.release()
+                    break
+                if frame is None:
+                    frames_in_flight.release()
+                    end_of_stream = True
+                    break
+                batch.append(frame)
+                if deadline is None:
+                    deadline = loop.time() + batch_timeout
+            if batch:
+                tasks.append(asyncio.create_task(detect(batch)))
+
+        results = await asyncio.gather(*tasks)
+        await producer  # Surface decoding errors
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        stopped.set()
+
+    return [event for batch_events in results for event in batch_events]
+
+
+async def process_video(state: SessionState, video_path: str, duration: float):
+    """Run frame analysis and summarization for an uploaded video, filling in its session"""
+    try:
+        vlm_interface = app.state.vlm
+        video_processor = VideoProcessor()
+        event_detector = EventDetector(vlm_interface)
+        summarizer = VideoSummarizer(vlm_interface, cache=app.state.prompt_cache)
+
+        def on_progress(frames_done: int):
+            state.frames_processed += frames_done
+
+        # Process video
+        logger.info("Processing video frames...")
+        frames = itertools.islice(video_processor.extract_frames(video_path), MAX_FRAMES_PER_VIDEO)
+        events = await detect_events(
+            event_detector, frames, on_progress=on_progress, executor=app.state.decode_executor
+        )
+
+        logger.info(f"Total events detected: {len(events)}")
+
+        # Generate summary
+        logger.info("Generating summary...")
+        summary = await asyncio.to_thread(summarizer.generate_summary, events, duration)
+
+        # Initialize and store agent and analysis
+        logger.info("Initializing chat agent...")
+        state.agent = VideoAnalysisAgent(events, summary, vlm_interface)
+        state.events = events
+        state.summary = summary
+        state.summary_json = orjson.dumps(summary)
+        state.highlights_json = orjson.dumps({"highlights": summary.get("key_highlights", [])})
+        state.statistics_json = orjson.dumps(summary.get("statistics", {}))
+        state.events_by_type_json = {
+            event_type.lower(): orjson.dumps({"events": type_events, "type": event_type})
+            for event_type, type_events in summary.get("events_by_type", {}).items()
+        }
+        state.status = "completed"
+        logger.info("Video analysis completed successfully")
+
+    except Exception as e:
+        logger.error(f"Unexpected error during video analysis: {e}")
+        state.error = str(e)
+        state.status = "failed"
+    finally:
+        if os.path.exists(video_path):
+            os.unlink(video_path)
+            logger.info(f"Cleaned up temp file: {video_path}")
 
 
-@app.post("/upload_video", response_model=UploadResponse)
+@app.post("/upload_video", response_class=MsgspecJSONResponse)
 async def upload_video(file: UploadFile = File(...)):
-    """Upload and analyze video"""
+    """Upload a video and start analyzing it in the background; poll /status/{session_id} for progress"""
     logger.info(f"Starting video upload: {file.filename}")
     
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        temp_path = tmp_file.name
-        logger.info(f"Video saved to temp file: {temp_path}")
+    # Stream the upload to disk in chunks so memory stays bounded for large videos
+    fd, temp_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    async with aiofiles.open(temp_path, "wb") as tmp_file:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await tmp_file.write(chunk)
+    logger.info(f"Video saved to temp file: {temp_path}")
 
     try:
-        # Initialize components
-        logger.info("Initializing video processor...")
-        video_processor = VideoProcessor()
-        
-        logger.info("Initializing VLM interface...")
-        vlm_interface = VLMInterface()
-        
         # Check VLM availability
         logger.info("Checking VLM availability...")
-        if not vlm_interface.is_available():
+        if not await asyncio.to_thread(app.state.vlm.is_available):
             logger.error("VLM not available")
             raise HTTPException(
                 status_code=503, 
                 detail="VLM not available. Please ensure Ollama is running and the model is loaded."
             )
-        
-        logger.info("Initializing event detector...")
-        event_detector = EventDetector(vlm_interface)
-        
-        logger.info("Initializing summarizer...")
-        summarizer = VideoSummarizer(vlm_interface)
 
         # Validate video
         logger.info("Validating video...")
-        validation = video_processor.validate_video(temp_path)
+        validation = VideoProcessor().validate_video(temp_path)
         if not validation["valid"]:
             logger.error(f"Video validation failed: {validation['error']}")
             raise HTTPException(status_code=400, detail=validation["error"])
 
-        # Process video
-        logger.info("Processing video frames...")
-        events = []
-        frame_count = 0
-        for frame in video_processor.extract_frames(temp_path):
-            try:
-                frame_events = event_detector.detect_events_in_frame(frame)
-                events.extend(frame_events)
-                frame_count += 1
-                logger.info(f"Processed frame {frame_count}, found {len(frame_events)} events")
-                
-                # Process more frames for better analysis
-                if frame_count > 50:  # Process max 50 frames for better coverage
-                    break
-            except Exception as e:
-                logger.error(f"Error processing frame {frame_count}: {e}")
-                continue
-
-        logger.info(f"Total events detected: {len(events)}")
-
-        # Generate summary
-        logger.info("Generating summary...")
-        summary = summarizer.generate_summary(events, validation["duration"])
-
-        # Initialize and store agent and analysis
-        logger.info("Initializing chat agent...")
-        analysis_state["agent"] = VideoAnalysisAgent(events, summary, vlm_interface)
-        analysis_state["events"] = events
-        analysis_state["summary"] = summary
-        analysis_state["vlm_available"] = True
-
-        # Prepare response data
-        events_by_type = summary.get("events_by_type", {})
-        key_highlights = summary.get("key_highlights", [])
-        statistics = summary.get("statistics", {})
-
-        logger.info("Upload completed successfully")
-        return UploadResponse(
-            status="success",
-            video_duration=validation["duration"],
-            events_detected=len(events),
-            summary=summary["overview"],
-            events_by_type=events_by_type,
-            key_highlights=key_highlights,
-            statistics=VideoStatistics(**statistics)
-        )
+        try:
+            session_id, state = sessions.create()
+        except SessionLimitReached:
+            logger.warning("Rejecting upload: every session is still being analyzed")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many videos are being analyzed. Please try again once one finishes."
+            )
 
     except HTTPException:
+        os.unlink(temp_path)
         raise
     except Exception as e:
+        os.unlink(temp_path)
         logger.error(f"Unexpected error during video upload: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
-            logger.info(f"Cleaned up temp file: {temp_path}")
+
+    # The background task owns the temp file from here on
+    state.frames_expected = min(math.ceil(validation["duration"] * FPS_SAMPLE_RATE), MAX_FRAMES_PER_VIDEO)
+    state.task = asyncio.create_task(process_video(state, temp_path, validation["duration"]))
+
+    logger.info(f"Upload accepted, analyzing in session {session_id}")
+    return MsgspecJSONResponse(UploadResponse(
+        status="processing",
+        session_id=session_id,
+        video_duration=validation["duration"]
+    ))
 
 
-@app.post("/chat", response_model=ChatResponse)
+@app.post("/chat", response_class=MsgspecJSONResponse)
 async def chat(message: ChatMessage):
     """Handle chat messages"""
-    agent = analysis_state.get("agent")
-    if not agent:
-        raise HTTPException(status_code=400, detail="No video uploaded yet")
+    state = get_session(message.session_id)
+
+    async with state.lock:
+        try:
+            response = await asyncio.to_thread(state.agent.chat, message.message)
+            return MsgspecJSONResponse(ChatResponse(response=response, status="success"))
+        except Exception as e:
+            return MsgspecJSONResponse(ChatResponse(
+                response=f"Error processing chat: {str(e)}", 
+                status="error"
+            ))
 
-    try:
-        response = agent.chat(message.message)
-        return ChatResponse(response=response, status="success")
-    except Exception as e:
-        return ChatResponse(
-            response=f"Error processing chat: {str(e)}", 
-            status="error"
-        )
 
+@app.post("/chat_stream")
+async def chat_stream(message: ChatMessage):
+    """Handle chat messages, streaming the response text as it is generated"""
+    state = get_session(message.session_id)
 
-@app.get("/status", response_model=StatusResponse)
-async def get_status():
+    async def response_stream():
+        async with state.lock:
+            # The VLM client is synchronous; each chunk is pulled in a worker thread
+            async for text in iterate_in_threadpool(state.agent.chat_stream(message.message)):
+                yield text
+
+    return StreamingResponse(response_stream(), media_type="text/plain; charset=utf-8")
+
+
+@app.get("/status", response_class=MsgspecJSONResponse)
+async def get_status(session_id: Optional[str] = None):
     """Get current analysis status"""
-    agent = analysis_state.get("agent")
-    summary = analysis_state.get("summary", {})
-    vlm_available = analysis_state.get("vlm_available", False)
+    state = sessions.get(session_id) if session_id else None
+    events = state.events if state else []
     
-    return StatusResponse(
-        video_loaded=agent is not None,
-        events_count=len(analysis_state.get("events", [])),
-        has_events=len(analysis_state.get("events", [])) > 0,
-        vlm_available=vlm_available
-    )
+    return MsgspecJSONResponse(StatusResponse(
+        video_loaded=state is not None and state.agent is not None,
+        events_count=len(events),
+        has_events=len(events) > 0,
+        vlm_available=state is not None and state.agent is not None,
+        analysis_status=state.status if state else None,
+        progress=state.progress if state else 0.0,
+        error=state.error if state else None
+    ))
+
+
+@app.get("/status/{session_id}", response_class=MsgspecJSONResponse)
+async def get_analysis_status(session_id: str):
+    """Get the background analysis progress of an uploaded video"""
+    if sessions.get(session_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown session. Please upload a video first.")
+    return await get_status(session_id)
 
 
 @app.get("/analysis")
-async def get_analysis():
+async def get_analysis(session_id: str):
     """Get complete video analysis"""
-    summary = analysis_state.get("summary", {})
-    if not summary:
-        raise HTTPException(status_code=400, detail="No video analysis available")
-    
-    return summary
+    return Response(content=get_session(session_id).summary_json, media_type="application/json")
 
 
-@app.get("/events/{event_type}")
-async def get_events_by_type(event_type: str):
-    """Get events of a specific type"""
-    agent = analysis_state.get("agent")
-    if not agent:
-        raise HTTPException(status_code=400, detail="No video uploaded yet")
-    
-    events = agent.search_events_by_type(event_type)
-    return {"events": events, "type": event_type}
+@app.get("/events/{event_type}", response_class=ORJSONResponse)
+async def get_events_by_type(event_type: str, session_id: str):
+    """Get events of a specific type (case-insensitive)"""
+    body = get_session(session_id).events_by_type_json.get(event_type.lower())
+    if body is None:
+        return {"events": [], "type": event_type}
+    return Response(content=body, media_type="application/json")
 
 
 @app.get("/highlights")
-async def get_highlights():
+async def get_highlights(session_id: str):
     """Get key highlights from the video"""
-    summary = analysis_state.get("summary", {})
-    if not summary:
-        raise HTTPException(status_code=400, detail="No video analysis available")
-    
-    return {"highlights": summary.get("key_highlights", [])}
+    return Response(content=get_session(session_id).highlights_json, media_type="application/json")
 
 
 @app.get("/statistics")
-async def get_statistics():
+async def get_statistics(session_id: str):
     """Get video analysis statistics"""
-    summary = analysis_state.get("summary", {})
-    if not summary:
-        raise HTTPException(status_code=400, detail="No video analysis available")
-    
-    return summary.get("statistics", {})
+    return Response(content=get_session(session_id).statistics_json, media_type="application/json")
 
 
-@app.get("/health")
+@app.get("/health", response_class=ORJSONResponse)
 async def health_check():
     """Health check endpoint"""
-    vlm_interface = VLMInterface()
     return {
         "status": "healthy",
-        "vlm_available": vlm_interface.is_available(),
+        "vlm_available": await asyncio.to_thread(app.state.vlm.is_available),
         "timestamp": "2024-01-01T00:00:00Z"
     }
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     from src.utils.config import API_HOST, API_PORT
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
+    # Single worker: analysis state lives in this process
+    uvicorn.run(
+        app,
+        host=API_HOST,
+        port=API_PORT,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
+    )
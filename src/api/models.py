@@ -1,12 +1,16 @@
 """
-Pydantic models for API request and response validation.
+API request and response models.
+Requests are validated by FastAPI through Pydantic; responses are built from trusted
+data and serialized with msgspec, so they are plain msgspec Structs.
 Generic models for any type of video content.
 """
+import msgspec
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 
 
 class ChatMessage(BaseModel):
+    session_id: str
     message: str
 
 
@@ -14,7 +18,7 @@ class ChatRequest(BaseModel):
     message: str
 
 
-class VideoEvent(BaseModel):
+class VideoEvent(msgspec.Struct):
     timestamp: str
     type: str
     description: str
@@ -22,7 +26,7 @@ class VideoEvent(BaseModel):
     objects: List[str]
 
 
-class VideoStatistics(BaseModel):
+class VideoStatistics(msgspec.Struct):
     total_events: int
     events_per_minute: float
     event_types: Dict[str, int]
@@ -30,33 +34,32 @@ class VideoStatistics(BaseModel):
     duration_minutes: float
 
 
-class VideoHighlights(BaseModel):
+class VideoHighlights(msgspec.Struct):
     highlights: List[str]
 
 
-class UploadResponse(BaseModel):
+class UploadResponse(msgspec.Struct):
     status: str
+    session_id: str
     video_duration: float
-    events_detected: int
-    summary: str
-    events_by_type: Dict[str, List[VideoEvent]]
-    key_highlights: List[str]
-    statistics: VideoStatistics
 
 
-class ChatResponse(BaseModel):
+class ChatResponse(msgspec.Struct):
     response: str
     status: str
 
 
-class StatusResponse(BaseModel):
+class StatusResponse(msgspec.Struct):
     video_loaded: bool
     events_count: int
     has_events: bool
     vlm_available: bool
+    analysis_status: Optional[str] = None
+    progress: float = 0.0
+    error: Optional[str] = None
 
 
-class VideoAnalysisResponse(BaseModel):
+class VideoAnalysisResponse(msgspec.Struct):
     overview: str
     timeline: List[Dict[str, Any]]
     events_by_type: Dict[str, List[VideoEvent]]
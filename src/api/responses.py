@@ -0,0 +1,24 @@
+"""
+Response classes for the API.
+"""
+from typing import Any
+
+import msgspec
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson instead of the standard library json module."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSON response for msgspec.Struct content, encoded without going through Pydantic."""
+
+    _encoder = msgspec.json.Encoder()
+
+    def render(self, content: Any) -> bytes:
+        return self._encoder.encode(content)
@@ -0,0 +1,80 @@
+"""
+Per-session analysis state for the API.
+Each uploaded video gets its own session so concurrent users don't overwrite each other.
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.agents.chat_agent import VideoAnalysisAgent
+from src.core.event_detector import DetectedEvent
+from src.utils.config import MAX_SESSIONS
+
+
+@dataclass
+class SessionState:
+    # "processing" until the background analysis finishes, then "completed" or "failed"
+    status: str = "processing"
+    error: Optional[str] = None
+    frames_expected: int = 0
+    frames_processed: int = 0
+    agent: Optional[VideoAnalysisAgent] = None
+    events: List[DetectedEvent] = field(default_factory=list)
+    summary: Dict[str, Any] = field(default_factory=dict)
+    # JSON bodies encoded once at upload time for the read-only endpoints
+    summary_json: bytes = b"{}"
+    highlights_json: bytes = b'{"highlights": []}'
+    statistics_json: bytes = b"{}"
+    # /events/{event_type} bodies keyed by lowercased event type
+    events_by_type_json: Dict[str, bytes] = field(default_factory=dict)
+    # Serializes chat turns so the agent's memory sees one exchange at a time
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Keeps a reference to the analysis task so it isn't garbage collected mid-run
+    task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def progress(self) -> float:
+        """Fraction of sampled frames analyzed so far, between 0 and 1."""
+        if self.status == "completed":
+            return 1.0
+        if self.frames_expected <= 0:
+            return 0.0
+        return min(self.frames_processed / self.frames_expected, 1.0)
+
+
+class SessionLimitReached(Exception):
+    """Raised when every session slot is still analyzing a video."""
+
+
+class SessionStore:
+    """Keeps the most recent sessions in memory, evicting the oldest finished one beyond max_sessions."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+
+    def create(self) -> Tuple[str, SessionState]:
+        """
+        Creates a new empty session and returns its id and state.
+        Raises SessionLimitReached if the store is full and no session has finished.
+        """
+        while len(self._sessions) >= self.max_sessions:
+            # Sessions still processing are never evicted, or their analysis would be lost mid-run
+            finished = next((sid for sid, state in self._sessions.items() if state.status != "processing"), None)
+            if finished is None:
+                raise SessionLimitReached(f"All {self.max_sessions} sessions are still analyzing a video")
+            del self._sessions[finished]
+
+        session_id = uuid.uuid4().hex
+        state = SessionState()
+        self._sessions[session_id] = state
+        return session_id, state
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        """Returns the session state, or None if it doesn't exist or was evicted."""
+        return self._sessions.get(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
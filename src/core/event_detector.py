@@ -2,12 +2,50 @@
 Event detection module for identifying events in video frames.
 Generic implementation for any type of video content.
 """
-from typing import Dict, List, Any
+from typing import Dict, FrozenSet, List, Any, Optional, Tuple
+import asyncio
+import json
 import re
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 from dataclasses import dataclass
 from enum import Enum
 from src.core.vlm_interface import VLMInterface
 from src.core.video_processor import VideoFrame
+from src.utils.helpers import DATACLASS_SLOTS, format_timestamp
+
+
+# JSON schema for batched frame analysis: one entry per image, in order
+BATCH_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "frames": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "events": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "type": {"type": "string"},
+                                "description": {"type": "string"},
+                                "severity": {"type": "string", "enum": ["low", "medium", "high"]},
+                                "objects": {"type": "array", "items": {"type": "string"}}
+                            },
+                            "required": ["type", "description", "severity", "objects"]
+                        }
+                    }
+                },
+                "required": ["events"]
+            }
+        }
+    },
+    "required": ["frames"]
+}
 
 
 class EventType(Enum):
@@ -19,7 +57,54 @@ class EventType(Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
+# Keyword tables for routing free text, checked in priority order; keywords match as substrings
+EVENT_TYPE_KEYWORDS = (
+    (EventType.ACTION_EVENT, frozenset(['action', 'movement', 'motion', 'activity', 'performing', 'doing'])),
+    (EventType.INTERACTION_EVENT, frozenset(['interaction', 'together', 'between', 'interacting', 'connection'])),
+    (EventType.SCENE_CHANGE, frozenset(['camera', 'pan', 'zoom', 'transition', 'scene', 'location', 'setting'])),
+    (EventType.ACTIVITY_EVENT, frozenset(['activity', 'process', 'ongoing', 'happening', 'event'])),
+    (EventType.OBJECT_EVENT, frozenset(['object', 'item', 'thing', 'element', 'entity', 'presence'])),
+)
+SUBTYPE_KEYWORDS = (
+    ("movement", frozenset(['moving', 'motion', 'action'])),
+    ("object_detected", frozenset(['object', 'item', 'thing'])),
+    ("interaction", frozenset(['interaction', 'together'])),
+    ("scene_change", frozenset(['camera', 'scene', 'transition'])),
+    ("activity", frozenset(['activity', 'process'])),
+)
+NL_OBJECT_KEYWORDS = frozenset(['object', 'item', 'thing', 'element', 'entity'])
+NL_MOVEMENT_KEYWORDS = frozenset(['moving', 'motion', 'action', 'activity', 'movement'])
+NL_INTERACTION_KEYWORDS = frozenset(['interaction', 'interacting', 'together', 'between'])
+
+ALL_KEYWORDS = frozenset().union(
+    *(keywords for _, keywords in EVENT_TYPE_KEYWORDS),
+    *(keywords for _, keywords in SUBTYPE_KEYWORDS),
+    NL_OBJECT_KEYWORDS, NL_MOVEMENT_KEYWORDS, NL_INTERACTION_KEYWORDS
+)
+
+# One structured event per line: TYPE|DESCRIPTION|SEVERITY with optional |OBJECTS; extra fields are ignored
+_EVENT_RE = re.compile(r'^([^|\n]*)\|([^|\n]*)\|([^|\n]*)(?:\|([^|\n]*))?[^\n]*$', re.M)
+
+if ahocorasick is not None:
+    # One automaton finds every keyword in a single pass over the text
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in ALL_KEYWORDS:
+        _KEYWORD_AUTOMATON.add_word(_keyword, _keyword)
+    _KEYWORD_AUTOMATON.make_automaton()
+else:
+    # Without pyahocorasick, a lookahead alternation still finds overlapping keywords in one scan.
+    # At each position only one alternative can match, which holds while no keyword is a prefix of another.
+    _KEYWORD_RE = re.compile("(?=(" + "|".join(map(re.escape, sorted(ALL_KEYWORDS))) + "))")
+
+
+def keyword_hits(text_lower: str) -> FrozenSet[str]:
+    """Returns the keywords occurring as substrings of already-lowercased text."""
+    if ahocorasick is None:
+        return frozenset(_KEYWORD_RE.findall(text_lower))
+    return frozenset(keyword for _, keyword in _KEYWORD_AUTOMATON.iter(text_lower))
+
+
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class DetectedEvent:
     timestamp: float
     event_type: EventType
@@ -27,9 +112,19 @@ class DetectedEvent:
     description: str
     severity: str  # low, medium, high
     confidence: float
-    objects_involved: List[str]
+    objects_involved: Tuple[str, ...]  # A tuple so events stay hashable
     frame_number: int
 
+    def to_dict(self) -> Dict[str, Any]:
+        """The event in the API's VideoEvent shape; fields are already well-typed, so no validation is needed"""
+        return {
+            "timestamp": format_timestamp(self.timestamp),
+            "type": self.event_type.value,
+            "description": self.description,
+            "severity": self.severity,
+            "objects": list(self.objects_involved)
+        }
+
 
 class EventDetector:
     def __init__(self, vlm_interface: VLMInterface):
@@ -62,7 +157,17 @@ IMPORTANT: Be specific and descriptive. If you cannot provide structured format,
 5. Objects and their purposes
 
 Format: EVENT_TYPE|Detailed description|SEVERITY|Objects involved
-If nothing notable, respond: NONE"""
+If nothing notable, respond: NONE""",
+
+            "batch": """You are given {count} video frames in chronological order. For each frame, identify any significant events, activities, or objects:
+1. Actions or movements (any physical activity or motion)
+2. Objects and their presence (any items, entities, or elements in the scene)
+3. Interactions between entities
+4. Scene changes or transitions (camera movements, location shifts)
+5. Activities or events happening (ongoing processes or events)
+
+Respond with JSON: {{"frames": [{{"events": [{{"type": "EVENT_TYPE", "description": "...", "severity": "low|medium|high", "objects": ["..."]}}]}}]}}
+Return exactly {count} entries in "frames", one per image and in the same order. EVENT_TYPE is one of ACTION_EVENT, OBJECT_EVENT, INTERACTION_EVENT, SCENE_CHANGE, ACTIVITY_EVENT. Use an empty "events" list for frames with nothing significant."""
         }
 
     def detect_events_in_frame(self, video_frame: VideoFrame) -> List[DetectedEvent]:
@@ -77,35 +182,74 @@ If nothing notable, respond: NONE"""
             video_frame.frame_number
         )
 
+    def detect_events_in_batch(self, video_frames: List[VideoFrame]) -> List[DetectedEvent]:
+        """Detect events in several frames with a single VLM request"""
+        if len(video_frames) == 1:
+            return self.detect_events_in_frame(video_frames[0])
+
+        response = self.vlm.analyze_frames(
+            [video_frame.frame for video_frame in video_frames],
+            self.detection_prompts["batch"].format(count=len(video_frames)),
+            response_format=BATCH_RESPONSE_SCHEMA
+        )
+        events = self._parse_batch_response(response, video_frames)
+        if events is None:
+            # The model didn't return one entry per frame; fall back to per-frame requests
+            events = [event for video_frame in video_frames for event in self.detect_events_in_frame(video_frame)]
+        return events
+
+    def warm_up(self) -> bool:
+        """Prefill the VLM with the frame detection prompt before the first video arrives"""
+        return self.vlm.warm_up(self.detection_prompts["general"])
+
+    async def detect_events_in_batch_async(self, video_frames: List[VideoFrame]) -> List[DetectedEvent]:
+        """Detect events in several frames without blocking the event loop"""
+        return await asyncio.to_thread(self.detect_events_in_batch, video_frames)
+
+    async def detect_events_in_frames(self, video_frames: List[VideoFrame],
+                                      images_per_request: int = 1) -> List[DetectedEvent]:
+        """
+        Detect events in a micro-batch of frames, issuing the VLM requests concurrently.
+        With images_per_request > 1, frames are grouped into multi-image requests instead.
+        Events are returned in frame order.
+        """
+        if images_per_request > 1:
+            groups = [video_frames[i:i + images_per_request] for i in range(0, len(video_frames), images_per_request)]
+            results = await asyncio.gather(*(self.detect_events_in_batch_async(group) for group in groups))
+            return [event for group_events in results for event in group_events]
+
+        prompt = self.detection_prompts["general"]
+        responses = await self.vlm.analyze_frames_batch([(video_frame.frame, prompt) for video_frame in video_frames])
+        return [
+            event
+            for video_frame, response in zip(video_frames, responses)
+            for event in self._parse_event_response(response, video_frame.timestamp, video_frame.frame_number)
+        ]
+
     def _parse_event_response(self, response: str, timestamp: float, frame_number: int) -> List[DetectedEvent]:
         """Parse VLM response into structured events"""
         events = []
         
-        # If response contains "NONE" or is empty, return no events
-        if "NONE" in response.upper() or not response.strip():
+        # The model answers NONE up front when nothing happens; only the start needs checking
+        if "NONE" in response[:64].upper() or not response.strip():
             return events
 
-        # Try to parse structured format first (with | separators)
-        lines = response.split('\n')
-        for line in lines:
-            if '|' in line:
-                parts = line.split('|')
-                if len(parts) >= 3:
-                    event_type_str = parts[0].strip()
-                    description = parts[1].strip()
-                    severity = parts[2].strip().lower()
-                    objects = parts[3].split(',') if len(parts) > 3 else []
-
-                    events.append(DetectedEvent(
-                        timestamp=timestamp,
-                        event_type=self._classify_event_type(event_type_str),
-                        subtype=self._extract_subtype(description),
-                        description=description,
-                        severity=severity,
-                        confidence=0.8,
-                        objects_involved=[obj.strip() for obj in objects],
-                        frame_number=frame_number
-                    ))
+        # Try to parse structured format first (TYPE|DESCRIPTION|SEVERITY[|OBJECTS] lines)
+        for match in _EVENT_RE.finditer(response):
+            event_type_str, description, severity, objects_raw = match.group(1, 2, 3, 4)
+            description = description.strip()
+            objects = objects_raw.split(',') if objects_raw is not None else []
+
+            events.append(DetectedEvent(
+                timestamp=timestamp,
+                event_type=self._classify_event_type(event_type_str.strip()),
+                subtype=self._extract_subtype(description),
+                description=description,
+                severity=severity.strip().lower(),
+                confidence=0.8,
+                objects_involved=tuple(obj.strip() for obj in objects),
+                frame_number=frame_number
+            ))
 
         # If no structured events found, try to extract from natural language
         if not events:
@@ -113,13 +257,47 @@ If nothing notable, respond: NONE"""
         
         return events
 
+    def _parse_batch_response(self, response: str, video_frames: List[VideoFrame]) -> Optional[List[DetectedEvent]]:
+        """Parse a batched JSON response; returns None if it doesn't match the frames"""
+        try:
+            per_frame = json.loads(response)["frames"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(per_frame, list) or len(per_frame) != len(video_frames):
+            return None
+
+        events = []
+        for video_frame, entry in zip(video_frames, per_frame):
+            frame_events = entry.get("events", []) if isinstance(entry, dict) else []
+            for item in frame_events:
+                if not isinstance(item, dict):
+                    continue
+                description = str(item.get("description", "")).strip()
+                if not description:
+                    continue
+                objects = item.get("objects", [])
+                if isinstance(objects, str):
+                    objects = objects.split(',')
+
+                events.append(DetectedEvent(
+                    timestamp=video_frame.timestamp,
+                    event_type=self._classify_event_type(str(item.get("type", ""))),
+                    subtype=self._extract_subtype(description),
+                    description=description,
+                    severity=str(item.get("severity", "low")).strip().lower(),
+                    confidence=0.8,
+                    objects_involved=tuple(str(obj).strip() for obj in objects),
+                    frame_number=video_frame.frame_number
+                ))
+        return events
+
     def _extract_events_from_natural_language(self, response: str, timestamp: float, frame_number: int) -> List[DetectedEvent]:
         """Extract events from natural language response"""
         events = []
-        response_lower = response.lower()
+        hits = keyword_hits(response.lower())
         
         # Generic object detection
-        if any(word in response_lower for word in ['object', 'item', 'thing', 'element', 'entity']):
+        if hits & NL_OBJECT_KEYWORDS:
             events.append(DetectedEvent(
                 timestamp=timestamp,
                 event_type=EventType.OBJECT_EVENT,
@@ -127,12 +305,12 @@ If nothing notable, respond: NONE"""
                 description="Object or entity detected in the scene",
                 severity="medium",
                 confidence=0.7,
-                objects_involved=["object"],
+                objects_involved=("object",),
                 frame_number=frame_number
             ))
         
         # Generic movement detection
-        if any(word in response_lower for word in ['moving', 'motion', 'action', 'activity', 'movement']):
+        if hits & NL_MOVEMENT_KEYWORDS:
             events.append(DetectedEvent(
                 timestamp=timestamp,
                 event_type=EventType.ACTION_EVENT,
@@ -140,12 +318,12 @@ If nothing notable, respond: NONE"""
                 description="Movement or action detected in the scene",
                 severity="low",
                 confidence=0.6,
-                objects_involved=["entity"],
+                objects_involved=("entity",),
                 frame_number=frame_number
             ))
         
         # Generic interaction detection
-        if any(word in response_lower for word in ['interaction', 'interacting', 'together', 'between']):
+        if hits & NL_INTERACTION_KEYWORDS:
             events.append(DetectedEvent(
                 timestamp=timestamp,
                 event_type=EventType.INTERACTION_EVENT,
@@ -153,7 +331,7 @@ If nothing notable, respond: NONE"""
                 description="Interaction between entities detected",
                 severity="medium",
                 confidence=0.6,
-                objects_involved=["entity"],
+                objects_involved=("entity",),
                 frame_number=frame_number
             ))
         
@@ -166,7 +344,7 @@ If nothing notable, respond: NONE"""
                 description=f"Scene analysis: {response[:100]}...",
                 severity="low",
                 confidence=0.5,
-                objects_involved=["scene"],
+                objects_involved=("scene",),
                 frame_number=frame_number
             ))
         
@@ -174,49 +352,16 @@ If nothing notable, respond: NONE"""
 
     def _classify_event_type(self, event_text: str) -> EventType:
         """Classify event into main categories"""
-        event_lower = event_text.lower()
-        
-        # Generic action-related keywords
-        action_keywords = ['action', 'movement', 'motion', 'activity', 'performing', 'doing']
-        
-        # Generic object-related keywords
-        object_keywords = ['object', 'item', 'thing', 'element', 'entity', 'presence']
-        
-        # Generic interaction-related keywords
-        interaction_keywords = ['interaction', 'together', 'between', 'interacting', 'connection']
-        
-        # Scene change keywords
-        scene_keywords = ['camera', 'pan', 'zoom', 'transition', 'scene', 'location', 'setting']
-        
-        # Activity keywords
-        activity_keywords = ['activity', 'process', 'ongoing', 'happening', 'event']
-
-        if any(keyword in event_lower for keyword in action_keywords):
-            return EventType.ACTION_EVENT
-        elif any(keyword in event_lower for keyword in interaction_keywords):
-            return EventType.INTERACTION_EVENT
-        elif any(keyword in event_lower for keyword in scene_keywords):
-            return EventType.SCENE_CHANGE
-        elif any(keyword in event_lower for keyword in activity_keywords):
-            return EventType.ACTIVITY_EVENT
-        elif any(keyword in event_lower for keyword in object_keywords):
-            return EventType.OBJECT_EVENT
-        else:
-            return EventType.UNKNOWN
+        hits = keyword_hits(event_text.lower())
+        for event_type, keywords in EVENT_TYPE_KEYWORDS:
+            if hits & keywords:
+                return event_type
+        return EventType.UNKNOWN
 
     def _extract_subtype(self, description: str) -> str:
         """Extract a subtype from the event description"""
-        description_lower = description.lower()
-        
-        if any(word in description_lower for word in ['moving', 'motion', 'action']):
-            return "movement"
-        elif any(word in description_lower for word in ['object', 'item', 'thing']):
-            return "object_detected"
-        elif any(word in description_lower for word in ['interaction', 'together']):
-            return "interaction"
-        elif any(word in description_lower for word in ['camera', 'scene', 'transition']):
-            return "scene_change"
-        elif any(word in description_lower for word in ['activity', 'process']):
-            return "activity"
-        else:
-            return "general"
+        hits = keyword_hits(description.lower())
+        for subtype, keywords in SUBTYPE_KEYWORDS:
+            if hits & keywords:
+                return subtype
+        return "general"
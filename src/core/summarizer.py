@@ -2,66 +2,114 @@
 Summarization module for creating summaries of detected events.
 Uses open-source LLM for better summarization.
 """
-from typing import List, Dict, Any
+from collections import Counter, defaultdict
+import json
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 from src.core.event_detector import DetectedEvent, EventType
+from src.core.vlm_cache import PromptCache
 from src.utils.helpers import format_timestamp
 import ollama
 
 
 class VideoSummarizer:
-    def __init__(self, vlm_interface=None):
+    def __init__(self, vlm_interface=None, cache: Optional[PromptCache] = None):
         self.vlm = vlm_interface
         # Use a smaller, faster model for summarization
         self.summary_model = "llama2:7b"  # Can be changed to other models like "mistral:7b"
+        # Long-lived callers pass one shared cache so each summarizer doesn't open its own connection
+        self.cache = cache if cache is not None else PromptCache()
         
     def generate_summary(self, events: List[DetectedEvent], video_duration: float) -> Dict[str, Any]:
         """Generate comprehensive video summary using LLM"""
+        overview, highlights = self._generate_overview_and_highlights(events, video_duration)
         summary = {
-            "overview": self._generate_overview(events, video_duration),
+            "overview": overview,
             "events_by_type": self._categorize_events(events),
             "timeline": self._create_timeline(events),
-            "key_highlights": self._generate_highlights(events),
+            "key_highlights": highlights,
             "statistics": self._generate_statistics(events, video_duration)
         }
         return summary
 
-    def _generate_overview(self, events: List[DetectedEvent], duration: float) -> str:
-        """Generate high-level overview using LLM"""
+    def _generate_overview_and_highlights(self, events: List[DetectedEvent], duration: float) -> Tuple[str, List[str]]:
+        """Generate the overview and key highlights with a single LLM call"""
         if not events:
-            return f"Video Analysis Summary ({format_timestamp(duration)}s):\nNo significant events detected in this video."
+            return (
+                f"Video Analysis Summary ({format_timestamp(duration)}s):\nNo significant events detected in this video.",
+                ["No significant events detected"]
+            )
         
         # Prepare event data for LLM
-        event_descriptions = []
-        for event in events:
-            event_descriptions.append(f"- {format_timestamp(event.timestamp)}: {event.description} ({event.event_type.value})")
-        
-        event_text = "\n".join(event_descriptions)
+        event_text = "\n".join(
+            f"- {format_timestamp(event.timestamp)}: {event.description} ({event.event_type.value})"
+            for event in events
+        )
+        key_events_text = "\n".join(
+            f"- {e.description} at {format_timestamp(e.timestamp)}" for e in self._key_events(events)
+        )
         
         # Create prompt for LLM
-        prompt = f"""Create a concise, engaging summary of this video based on the following events:
+        prompt = f"""Summarize this video based on the following events:
 
 Video Duration: {format_timestamp(duration)}s
 Events Detected:
 {event_text}
 
-Please provide a natural, conversational summary that:
+Key Events:
+{key_events_text}
+
+Write an "overview": a natural, conversational summary that:
 1. Describes what happened in the video
 2. Highlights the most important events
 3. Mentions the key people, objects, or activities involved
 4. Gives a sense of the overall flow and context
+Keep it engaging and informative, as if explaining to someone who hasn't seen the video.
+
+Write 3-5 "highlights" based on the key events that:
+1. Are concise and interesting
+2. Capture the most important moments
+3. Give context about what happened
 
-Keep the summary engaging and informative, as if explaining to someone who hasn't seen the video."""
+Return JSON: {{"overview": "...", "highlights": ["...", "..."]}}"""
 
         try:
-            # Use Ollama for summarization
-            response = ollama.chat(
-                model=self.summary_model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response['message']['content']
-        except Exception as e:
+            result = json.loads(self._chat(prompt, response_format="json"))
+            overview = result.get("overview") if isinstance(result, dict) else None
+            highlights = result.get("highlights") if isinstance(result, dict) else None
+            # A highlights string would otherwise be split into single characters
+            if not isinstance(overview, str) or not isinstance(highlights, list):
+                raise ValueError("Malformed summary response")
+            highlights = [str(h).strip() for h in highlights if str(h).strip()]
+            if not overview.strip() or not highlights:
+                raise ValueError("Incomplete summary response")
+            return overview.strip(), highlights[:5]  # Limit to 5 highlights
+        except Exception:
             # Fallback to basic summary if LLM fails
-            return self._generate_basic_overview(events, duration)
+            return self._generate_basic_overview(events, duration), self._generate_basic_highlights(events)
+
+    def _chat(self, prompt: str, response_format: Optional[str] = None) -> str:
+        """
+        Send a prompt to the summary model and return the reply text, reusing the VLM's pooled
+        client when available. Replies are cached per prompt according to VLM_CACHE_MODE.
+        """
+        cache_key = self.cache.key(prompt, self.summary_model)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        if self.cache.replay_only:
+            raise LookupError("No cached summary response (VLM_CACHE_MODE=replay)")
+
+        client = getattr(self.vlm, "client", None) or ollama
+        response = client.chat(
+            model=self.summary_model,
+            messages=[{"role": "user", "content": prompt}],
+            format=response_format,
+            options={"temperature": 0.3}
+        )
+        content = response['message']['content']
+        self.cache.put(cache_key, content)
+        return content
 
     def _generate_basic_overview(self, events: List[DetectedEvent], duration: float) -> str:
         """Generate basic overview without LLM"""
@@ -78,27 +126,18 @@ Keep the summary engaging and informative, as if explaining to someone who hasn'
 
     def _categorize_events(self, events: List[DetectedEvent]) -> Dict[str, List[Dict[str, Any]]]:
         """Categorize events by type"""
-        categorized = {}
-        
+        categorized = defaultdict(list)
         for event in events:
-            event_type = event.event_type.value
-            if event_type not in categorized:
-                categorized[event_type] = []
-            
-            categorized[event_type].append({
-                "timestamp": format_timestamp(event.timestamp),
-                "type": event.event_type.value,
-                "description": event.description,
-                "severity": event.severity,
-                "objects": event.objects_involved
-            })
-        
-        return categorized
+            categorized[event.event_type.value].append(event.to_dict())
+        return dict(categorized)
 
     def _create_timeline(self, events: List[DetectedEvent]) -> List[Dict[str, Any]]:
         """Create chronological timeline"""
         timeline = []
-        for event in sorted(events, key=lambda x: x.timestamp):
+        # Stable argsort keeps events with equal timestamps in detection order, like sorted()
+        timestamps = np.fromiter((event.timestamp for event in events), dtype=np.float64, count=len(events))
+        for i in np.argsort(timestamps, kind="stable"):
+            event = events[i]
             timeline.append({
                 "time": format_timestamp(event.timestamp),
                 "event": event.description,
@@ -107,45 +146,15 @@ Keep the summary engaging and informative, as if explaining to someone who hasn'
             })
         return timeline
 
-    def _generate_highlights(self, events: List[DetectedEvent]) -> List[str]:
-        """Generate key highlights using LLM"""
-        if not events:
-            return ["No significant events detected"]
-        
-        # Get high-severity events
+    @staticmethod
+    def _key_events(events: List[DetectedEvent]) -> List[DetectedEvent]:
+        """High-severity events, or the first 3 events if there are none"""
         high_severity_events = [e for e in events if e.severity == "high"]
-        if not high_severity_events:
-            high_severity_events = events[:3]  # Take first 3 if no high severity
-        
-        event_descriptions = [f"- {e.description} at {format_timestamp(e.timestamp)}" for e in high_severity_events]
-        events_text = "\n".join(event_descriptions)
-        
-        prompt = f"""Based on these key events from a video, create 3-5 engaging highlights:
-
-{events_text}
+        return high_severity_events or events[:3]
 
-Please provide highlights that:
-1. Are concise and interesting
-2. Capture the most important moments
-3. Give context about what happened
-4. Are written in an engaging way
-
-Format as a simple list of highlights."""
-
-        try:
-            response = ollama.chat(
-                model=self.summary_model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            # Parse response into list
-            highlights_text = response['message']['content']
-            highlights = [line.strip().lstrip('- ').lstrip('• ').lstrip('* ') 
-                         for line in highlights_text.split('\n') 
-                         if line.strip() and not line.strip().startswith('#')]
-            return highlights[:5]  # Limit to 5 highlights
-        except Exception as e:
-            # Fallback to basic highlights
-            return [f"{e.description} at {format_timestamp(e.timestamp)}" for e in high_severity_events[:3]]
+    def _generate_basic_highlights(self, events: List[DetectedEvent]) -> List[str]:
+        """Generate highlights without LLM"""
+        return [f"{e.description} at {format_timestamp(e.timestamp)}" for e in self._key_events(events)[:3]]
 
     def _generate_statistics(self, events: List[DetectedEvent], duration: float) -> Dict[str, Any]:
         """Generate video statistics"""
@@ -158,21 +167,17 @@ Format as a simple list of highlights."""
                 "duration_minutes": round(duration / 60, 2)
             }
         
-        # Count events by type
-        event_types = {}
-        severity_dist = {"low": 0, "medium": 0, "high": 0}
-        
-        for event in events:
-            event_type = event.event_type.value
-            event_types[event_type] = event_types.get(event_type, 0) + 1
-            severity_dist[event.severity] = severity_dist.get(event.severity, 0) + 1
+        # Count events by type and severity
+        event_types = Counter(event.event_type.value for event in events)
+        severity_dist = Counter({"low": 0, "medium": 0, "high": 0})
+        severity_dist.update(event.severity for event in events)
         
         events_per_minute = len(events) / (duration / 60) if duration > 0 else 0
         
         return {
             "total_events": len(events),
             "events_per_minute": round(events_per_minute, 2),
-            "event_types": event_types,
-            "severity_distribution": severity_dist,
+            "event_types": dict(event_types),
+            "severity_distribution": dict(severity_dist),
             "duration_minutes": round(duration / 60, 2)
         }
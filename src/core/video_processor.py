@@ -3,12 +3,17 @@ Video processing module for extracting frames and validating video files.
 """
 import cv2
 import numpy as np
-from typing import Generator
+try:
+    import av
+except ImportError:
+    av = None
+from typing import Generator, Iterator, Tuple
 from dataclasses import dataclass
-from src.utils.config import MAX_VIDEO_DURATION, FPS_SAMPLE_RATE
+from src.utils.helpers import DATACLASS_SLOTS
+from src.utils.config import MAX_VIDEO_DURATION, FPS_SAMPLE_RATE, FRAME_DIFF_THRESHOLD, FRAME_MIN_INTERVAL
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class VideoFrame:
     frame: np.ndarray
     timestamp: float
@@ -16,38 +21,98 @@ class VideoFrame:
 
 
 class VideoProcessor:
-    def __init__(self, fps_sample_rate: int = FPS_SAMPLE_RATE):
+    def __init__(self, fps_sample_rate: int = FPS_SAMPLE_RATE, diff_threshold: float = FRAME_DIFF_THRESHOLD,
+                 min_interval: float = FRAME_MIN_INTERVAL):
         self.fps_sample_rate = fps_sample_rate
+        self.diff_threshold = diff_threshold
+        self.min_interval = min_interval
+
+    @staticmethod
+    def _thumbnail(frame: np.ndarray) -> np.ndarray:
+        """Small grayscale copy of a frame for cheap change detection"""
+        return cv2.cvtColor(cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
 
     def extract_frames(self, video_path: str) -> Generator[VideoFrame, None, None]:
-        """Extract frames at specified sample rate"""
+        """
+        Extract frames at specified sample rate, skipping sampled frames that barely differ
+        from the last yielded one unless min_interval seconds have passed since it
+        """
+        last_thumb = None
+        last_timestamp = 0.0
+
+        for frame, timestamp, frame_number in self._sampled_frames(video_path):
+            thumb = self._thumbnail(frame)
+            redundant = (
+                last_thumb is not None
+                and timestamp - last_timestamp < self.min_interval
+                and cv2.absdiff(thumb, last_thumb).mean() < self.diff_threshold
+            )
+            if not redundant:
+                last_thumb, last_timestamp = thumb, timestamp
+                yield VideoFrame(
+                    frame=frame,
+                    timestamp=timestamp,
+                    frame_number=frame_number
+                )
+
+    def _frame_interval(self, fps: float) -> int:
+        """Number of decoded frames per sampled frame"""
+        return max(int(fps / self.fps_sample_rate), 1)
+
+    def _sampled_frames(self, video_path: str) -> Iterator[Tuple[np.ndarray, float, int]]:
+        """Yield (BGR frame, timestamp, frame number) for every sampled frame"""
+        if av is not None:
+            return self._sampled_frames_av(video_path)
+        return self._sampled_frames_cv2(video_path)
+
+    def _sampled_frames_av(self, video_path: str) -> Iterator[Tuple[np.ndarray, float, int]]:
+        """Decode with PyAV; FFmpeg decodes on several threads and only sampled frames are converted to arrays"""
+        try:
+            container = av.open(video_path)
+        except (av.error.FFmpegError, OSError) as e:
+            raise ValueError(f"Cannot open video: {video_path}") from e
+
+        with container:
+            if not container.streams.video:
+                raise ValueError(f"Cannot open video: {video_path}")
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            fps = float(stream.average_rate or stream.guessed_rate or 0)
+            if fps > 0:
+                frame_interval = self._frame_interval(fps)
+
+                for frame_count, frame in enumerate(container.decode(stream)):
+                    if frame_count % frame_interval == 0:
+                        timestamp = frame.time if frame.time is not None else frame_count / fps
+                        yield frame.to_ndarray(format="bgr24"), timestamp, frame_count
+                return
+
+        # The stream reports no frame rate to sample by; OpenCV probes it differently
+        yield from self._sampled_frames_cv2(video_path)
+
+    def _sampled_frames_cv2(self, video_path: str) -> Iterator[Tuple[np.ndarray, float, int]]:
+        """Decode with OpenCV; skipped frames are only grabbed, never retrieved into arrays"""
         cap = cv2.VideoCapture(video_path)
 
         if not cap.isOpened():
             raise ValueError(f"Cannot open video: {video_path}")
 
         fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps / self.fps_sample_rate)
-        if frame_interval == 0:
-            frame_interval = 1
+        frame_interval = self._frame_interval(fps)
         frame_count = 0
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            if frame_count % frame_interval == 0:
-                timestamp = frame_count / fps
-                yield VideoFrame(
-                    frame=frame,
-                    timestamp=timestamp,
-                    frame_number=frame_count
-                )
-
-            frame_count += 1
-
-        cap.release()
+        try:
+            while cap.grab():
+                if frame_count % frame_interval == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    # Without a frame rate, fall back to the decoder's position in the stream
+                    timestamp = frame_count / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                    yield frame, timestamp, frame_count
+                frame_count += 1
+        finally:
+            cap.release()
 
     def validate_video(self, video_path: str) -> dict:
         """Validate video meets requirements"""
@@ -0,0 +1,161 @@
+"""
+Response caches for VLM and LLM calls.
+Frames are keyed by a perceptual hash, so visually near-identical frames
+(common on static scenes) reuse a stored response instead of re-running the VLM.
+Text-only prompts, such as the summarizer's, are keyed by their exact content.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+from src.utils.config import VLM_CACHE_MODE, VLM_CACHE_PATH, VLM_CACHE_HASH_DISTANCE
+from src.utils.helpers import perceptual_hash
+
+CACHE_MODES = ("enabled", "replay", "write-only", "disabled")
+
+
+class CacheKey(NamedTuple):
+    prompt_key: str  # SHA256 of prompt and model
+    frame_hash: int  # 64-bit perceptual hash of the frame
+
+
+def prompt_key(prompt: str, model: str) -> str:
+    """SHA256 identifying a prompt sent to a model with the default options."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class _SQLiteCache:
+    """Shared cache-mode handling and SQLite connection; subclasses define the table."""
+
+    schema = ""
+
+    def __init__(self, path: str = VLM_CACHE_PATH, mode: str = VLM_CACHE_MODE):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown VLM cache mode: {mode} (expected one of {', '.join(CACHE_MODES)})")
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != "disabled":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(self.schema)
+            self._conn.commit()
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def readable(self) -> bool:
+        return self.mode in ("enabled", "replay")
+
+    @property
+    def writable(self) -> bool:
+        return self.mode in ("enabled", "write-only")
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    def close(self):
+        """Closes the SQLite connection once nothing will use the cache again."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ResponseCache(_SQLiteCache):
+    """SQLite-backed store of VLM responses keyed by frame perceptual hash, prompt and model."""
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "prompt_key TEXT NOT NULL, frame_hash INTEGER NOT NULL, response TEXT NOT NULL, "
+        "PRIMARY KEY (prompt_key, frame_hash))"
+    )
+
+    def __init__(self, path: str = VLM_CACHE_PATH, mode: str = VLM_CACHE_MODE,
+                 max_distance: int = VLM_CACHE_HASH_DISTANCE):
+        super().__init__(path, mode)
+        self.max_distance = max_distance
+
+    def key(self, frame: np.ndarray, prompt: str, model: str) -> Optional[CacheKey]:
+        """Returns the cache key for a request, or None when caching is disabled."""
+        if self._conn is None:
+            return None
+        # SQLite integers are signed 64-bit
+        frame_hash = perceptual_hash(frame)
+        if frame_hash >= 1 << 63:
+            frame_hash -= 1 << 64
+        return CacheKey(prompt_key(prompt, model), frame_hash)
+
+    def get(self, key: Optional[CacheKey]) -> Optional[str]:
+        """Returns the stored response for the closest frame within max_distance bits, if any."""
+        if key is None or not self.readable:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE prompt_key = ? AND frame_hash = ?", key
+            ).fetchone()
+            if row is not None or self.max_distance <= 0:
+                return row[0] if row else None
+            rows = self._conn.execute(
+                "SELECT frame_hash, response FROM responses WHERE prompt_key = ?", (key.prompt_key,)
+            ).fetchall()
+
+        best_distance, best_response = self.max_distance + 1, None
+        for frame_hash, response in rows:
+            distance = bin((frame_hash ^ key.frame_hash) & 0xFFFFFFFFFFFFFFFF).count("1")
+            if distance < best_distance:
+                best_distance, best_response = distance, response
+        return best_response
+
+    def lookup(self, frame: np.ndarray, prompt: str, model: str) -> Tuple[Optional[CacheKey], Optional[str]]:
+        """Returns the cache key for a request together with its cached response, if any."""
+        key = self.key(frame, prompt, model)
+        return key, self.get(key)
+
+    def put(self, key: Optional[CacheKey], response: str):
+        """Stores a response for the frame and prompt in key."""
+        if key is None or not self.writable:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (prompt_key, frame_hash, response) VALUES (?, ?, ?)",
+                (*key, response)
+            )
+            self._conn.commit()
+
+
+class PromptCache(_SQLiteCache):
+    """SQLite-backed store of text-only LLM responses keyed by the exact prompt and model."""
+
+    schema = "CREATE TABLE IF NOT EXISTS prompt_responses (prompt_key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+
+    def key(self, prompt: str, model: str) -> Optional[str]:
+        """Returns the cache key for a request, or None when caching is disabled."""
+        if self._conn is None:
+            return None
+        return prompt_key(prompt, model)
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Returns the stored response for key, if any."""
+        if key is None or not self.readable:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM prompt_responses WHERE prompt_key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: Optional[str], response: str):
+        """Stores the response for key."""
+        if key is None or not self.writable:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompt_responses (prompt_key, response) VALUES (?, ?)", (key, response)
+            )
+            self._conn.commit()
@@ -2,12 +2,49 @@
 VLM Interface for interacting with the Vision Language Model.
 This implementation uses Ollama for CPU-based inference.
 """
+import asyncio
+import httpx
 import ollama
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 import numpy as np
 import time
-from src.utils.config import VLM_MODEL, VLM_API_BASE
+from src.utils.config import (
+    VLM_MODEL, VLM_API_BASE, VLM_AVAILABILITY_TTL, VLM_CONNECT_TIMEOUT,
+    VLM_MAX_CONNECTIONS, VLM_MAX_KEEPALIVE_CONNECTIONS, VLM_KEEP_ALIVE, VLM_RATE_LIMIT_RPM, VLM_RATE_LIMIT_TPM,
+    FRAME_ANALYSIS_CONCURRENCY
+)
+from src.core.vlm_cache import ResponseCache
 from src.utils.helpers import frame_to_base64
+from src.utils.rate_limit import TokenBucket, estimate_tokens
+
+# Wraps the caller's prompt; kept byte-identical across requests so Ollama can reuse the cached prefill
+FRAME_ANALYSIS_PREAMBLE = "Please provide a detailed and accurate analysis of the image you are given.\n\n"
+FRAME_ANALYSIS_GUIDELINES = """
+
+Guidelines:
+- Be specific and descriptive
+- Focus on what is actually visible in the image
+- Use clear, concise language
+- If uncertain about something, acknowledge the uncertainty
+- Provide structured responses when possible"""
+FRAME_USER_PROMPT = "Please analyze the image and respond:"
+REPLAY_MISS_RESPONSE = "Error: no cached response for this frame (VLM_CACHE_MODE=replay)"
+
+FRAME_ANALYSIS_OPTIONS = {
+    "temperature": 0.3,  # Lower temperature for more consistent analysis
+    "top_p": 0.8,
+    "num_predict": 512
+}
+
+
+def _is_none_response(text: str) -> bool:
+    """Whether a partial frame response already answers NONE, so the rest need not be generated."""
+    return "NONE" in text[:16].upper()
+
+
+def frame_system_prompt(prompt: str) -> str:
+    """The static system message placed ahead of every frame sent with prompt."""
+    return FRAME_ANALYSIS_PREAMBLE + prompt + FRAME_ANALYSIS_GUIDELINES
 
 
 class VLMInterface:
@@ -15,15 +52,48 @@ class VLMInterface:
         self.model_name = model_name
         self.max_retries = 3
         self.retry_delay = 1.0
+        self._available = False
+        self._availability_checked_at = None
+        self.client = None
+        self.async_client = None
+        # Caps the frame requests in flight to Ollama across all concurrent batches
+        self._request_slots = asyncio.Semaphore(FRAME_ANALYSIS_CONCURRENCY)
+        self.cache = ResponseCache()
+        # Smooths bursts of requests to the server's capacity; disabled unless limits are configured
+        self.rate_limiter = TokenBucket(rpm=VLM_RATE_LIMIT_RPM, tpm=VLM_RATE_LIMIT_TPM)
+        self._connect()
+
+    def _connect(self):
+        """Create the Ollama client, leaving it unset if Ollama cannot be reached."""
+        # One pooled keep-alive connection set shared by every call through this interface
+        client_options = dict(
+            host=VLM_API_BASE,
+            timeout=httpx.Timeout(None, connect=VLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=VLM_MAX_CONNECTIONS,
+                max_keepalive_connections=VLM_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
         try:
-            self.client = ollama.Client(host=VLM_API_BASE)
+            self.client = ollama.Client(**client_options)
             # Test connection
             self.client.list()
+            self.async_client = ollama.AsyncClient(**client_options)
         except Exception as e:
             print(f"Warning: Could not connect to Ollama at {VLM_API_BASE}")
             print(f"Error: {e}")
             print("Please ensure Ollama is running and the model is available")
             self.client = None
+            self.async_client = None
+
+    async def aclose(self):
+        """Close the pooled connections to Ollama held by both clients."""
+        if self.client:
+            self.client.close()
+        if self.async_client:
+            await self.async_client.close()
+        self.client = None
+        self.async_client = None
 
     def chat_with_context(self, messages: List[Dict[str, str]]) -> str:
         """
@@ -35,6 +105,7 @@ class VLMInterface:
         
         for attempt in range(self.max_retries):
             try:
+                self.rate_limiter.acquire(estimate_tokens(messages, 1024))
                 response = self.client.chat(
                     model=self.model_name,
                     messages=messages,
@@ -52,61 +123,204 @@ class VLMInterface:
                 else:
                     return f"Error communicating with the VLM: {str(e)}"
 
+    def chat_with_context_stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        Streams the VLM's response to a chat history as it is generated.
+        Yields text fragments; errors are yielded as a message instead of raised.
+        """
+        if not self.client:
+            yield "Error: VLM not available. Please check Ollama connection."
+            return
+        
+        try:
+            self.rate_limiter.acquire(estimate_tokens(messages, 1024))
+            for chunk in self.client.chat(
+                model=self.model_name,
+                messages=messages,
+                stream=True,
+                options={
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "num_predict": 1024
+                }
+            ):
+                content = chunk['message']['content']
+                if content:
+                    yield content
+        except Exception as e:
+            print(f"Error during VLM chat stream: {e}")
+            yield f"Error communicating with the VLM: {str(e)}"
+
+    def _frame_messages(self, frame: np.ndarray, prompt: str) -> List[Dict[str, Any]]:
+        """Build the chat messages asking the VLM to analyze one frame."""
+        # The image goes last so every request for the same prompt shares the same token prefix
+        return [
+            {'role': 'system', 'content': frame_system_prompt(prompt)},
+            {'role': 'user', 'content': FRAME_USER_PROMPT, 'images': [frame_to_base64(frame)]}
+        ]
+
+    def warm_up(self, prompt: str) -> bool:
+        """
+        Load the model and prefill the frame-analysis prefix for prompt, so the first
+        frames don't pay for it. Returns False if the VLM could not be reached.
+        """
+        if not self.client:
+            return False
+        
+        try:
+            self.client.chat(
+                model=self.model_name,
+                messages=[{'role': 'system', 'content': frame_system_prompt(prompt)}],
+                keep_alive=VLM_KEEP_ALIVE,
+                options={"num_predict": 1}
+            )
+            return True
+        except Exception as e:
+            print(f"Error warming up the VLM: {e}")
+            return False
+
     def analyze_frame(self, frame: np.ndarray, prompt: str) -> str:
         """Analyze single frame with custom prompt (for initial analysis)."""
+        cache_key, cached = self.cache.lookup(frame, prompt, self.model_name)
+        if cached is not None:
+            return cached
+        if self.cache.replay_only:
+            return REPLAY_MISS_RESPONSE
         if not self.client:
             return "Error: VLM not available. Please check Ollama connection."
         
-        # Enhance the prompt for better analysis
-        enhanced_prompt = f"""Please provide a detailed and accurate analysis of this image. 
+        messages = self._frame_messages(frame, prompt)
+        for attempt in range(self.max_retries):
+            try:
+                self.rate_limiter.acquire(estimate_tokens(messages, FRAME_ANALYSIS_OPTIONS["num_predict"]))
+                stream = self.client.chat(
+                    model=self.model_name,
+                    messages=messages,
+                    stream=True,
+                    keep_alive=VLM_KEEP_ALIVE,
+                    options=FRAME_ANALYSIS_OPTIONS
+                )
+                text = ""
+                try:
+                    for chunk in stream:
+                        text += chunk['message']['content']
+                        if _is_none_response(text):
+                            break
+                finally:
+                    if hasattr(stream, "close"):
+                        stream.close()  # Dropping the connection makes Ollama stop generating
+                self.cache.put(cache_key, text)
+                return text
+            except Exception as e:
+                print(f"Error analyzing frame (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
+                else:
+                    return f"Error analyzing frame: {str(e)}"
 
-{prompt}
+    async def analyze_frame_async(self, frame: np.ndarray, prompt: str) -> str:
+        """Analyze a single frame without blocking the event loop."""
+        cache_key, cached = None, None
+        if self.cache.active:
+            cache_key, cached = await asyncio.to_thread(self.cache.lookup, frame, prompt, self.model_name)
+        if cached is not None:
+            return cached
+        if self.cache.replay_only:
+            return REPLAY_MISS_RESPONSE
+        if not self.async_client:
+            return "Error: VLM not available. Please check Ollama connection."
+        
+        messages = await asyncio.to_thread(self._frame_messages, frame, prompt)
+        for attempt in range(self.max_retries):
+            try:
+                await self.rate_limiter.acquire_async(estimate_tokens(messages, FRAME_ANALYSIS_OPTIONS["num_predict"]))
+                async with self._request_slots:
+                    stream = await self.async_client.chat(
+                        model=self.model_name,
+                        messages=messages,
+                        stream=True,
+                        keep_alive=VLM_KEEP_ALIVE,
+                        options=FRAME_ANALYSIS_OPTIONS
+                    )
+                    text = ""
+                    try:
+                        async for chunk in stream:
+                            text += chunk['message']['content']
+                            if _is_none_response(text):
+                                break
+                    finally:
+                        if hasattr(stream, "aclose"):
+                            await stream.aclose()  # Dropping the connection makes Ollama stop generating
+                if cache_key is not None:
+                    await asyncio.to_thread(self.cache.put, cache_key, text)
+                return text
+            except Exception as e:
+                print(f"Error analyzing frame (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay)
+                else:
+                    return f"Error analyzing frame: {str(e)}"
 
-Guidelines:
-- Be specific and descriptive
-- Focus on what is actually visible in the image
-- Use clear, concise language
-- If uncertain about something, acknowledge the uncertainty
-- Provide structured responses when possible
+    async def analyze_frames_batch(self, items: List[Tuple[np.ndarray, str]]) -> List[str]:
+        """
+        Analyze several (frame, prompt) pairs as concurrent requests.
+        Responses are returned in the same order as items.
+        """
+        return list(await asyncio.gather(
+            *(self.analyze_frame_async(frame, prompt) for frame, prompt in items)
+        ))
 
-Please analyze the image and respond:"""
+    def analyze_frames(self, frames: List[np.ndarray], prompt: str,
+                       response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Analyze several frames in one request; the prompt should ask for one answer per image."""
+        if not self.client:
+            return "Error: VLM not available. Please check Ollama connection."
         
+        messages = [{
+            'role': 'user',
+            'content': prompt,
+            'images': [frame_to_base64(frame) for frame in frames]
+        }]
         for attempt in range(self.max_retries):
             try:
-                b64_image = frame_to_base64(frame)
+                self.rate_limiter.acquire(estimate_tokens(messages, 512 * len(frames)))
                 response = self.client.chat(
                     model=self.model_name,
-                    messages=[{
-                        'role': 'user',
-                        'content': enhanced_prompt,
-                        'images': [b64_image]
-                    }],
+                    messages=messages,
+                    format=response_format,
                     options={
-                        "temperature": 0.3,  # Lower temperature for more consistent analysis
+                        "temperature": 0.3,
                         "top_p": 0.8,
-                        "num_predict": 512
+                        "num_predict": 512 * len(frames)
                     }
                 )
                 return response['message']['content']
             except Exception as e:
-                print(f"Error analyzing frame (attempt {attempt + 1}): {e}")
+                print(f"Error analyzing frames (attempt {attempt + 1}): {e}")
                 if attempt < self.max_retries - 1:
                     time.sleep(self.retry_delay)
                 else:
-                    return f"Error analyzing frame: {str(e)}"
+                    return f"Error analyzing frames: {str(e)}"
 
     def is_available(self) -> bool:
-        """Check if the VLM is available and ready."""
+        """Check if the VLM is available and ready, caching the result for a few seconds."""
+        now = time.monotonic()
+        if self._availability_checked_at is not None and now - self._availability_checked_at < VLM_AVAILABILITY_TTL:
+            return self._available
+        
+        if not self.client:
+            self._connect()
+        self._available = self._check_available()
+        self._availability_checked_at = now
+        return self._available
+
+    def _check_available(self) -> bool:
+        """Confirm the server responds and has the model, without running a generation."""
         if not self.client:
             return False
         
         try:
-            # Test with a simple request
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "Hello"}],
-                options={"num_predict": 10}
-            )
+            self.client.show(self.model_name)
             return True
         except Exception:
             return False
@@ -7,17 +7,47 @@ import os
 # VLM Configuration
 VLM_MODEL = os.getenv("VLM_MODEL", "llava:7b")  # Default to LLaVA 7B via Ollama
 VLM_API_BASE = os.getenv("VLM_API_BASE", "http://localhost:11434") # Ollama API
+VLM_AVAILABILITY_TTL = 5.0  # Seconds to reuse the last VLM availability check
+VLM_CONNECT_TIMEOUT = 5.0  # Seconds to wait when opening a connection to Ollama
+VLM_MAX_CONNECTIONS = 32  # Connection pool size for the shared Ollama client
+VLM_MAX_KEEPALIVE_CONNECTIONS = 16
+# Client-side limits on VLM requests and estimated tokens per minute; 0 disables each limit
+VLM_RATE_LIMIT_RPM = float(os.getenv("VLM_RATE_LIMIT_RPM", "0"))
+VLM_RATE_LIMIT_TPM = float(os.getenv("VLM_RATE_LIMIT_TPM", "0"))
+VLM_KEEP_ALIVE = os.getenv("VLM_KEEP_ALIVE", "30m")  # How long Ollama keeps the model (and its prompt cache) loaded
+# Response cache for frame analysis and summaries: enabled (read + write), replay (read only, never calls the VLM),
+# write-only (always calls the VLM and records responses) or disabled
+VLM_CACHE_MODE = os.getenv("VLM_CACHE_MODE", "disabled")
+VLM_CACHE_PATH = os.getenv("VLM_CACHE_PATH", ".cache/vlm_responses.sqlite3")
+VLM_CACHE_HASH_DISTANCE = 4  # Max differing perceptual-hash bits for two frames to share a response
 
 # Video Processing Configuration
 FPS_SAMPLE_RATE = 1  # Frames per second to sample from the video
 MAX_VIDEO_DURATION = 120  # Maximum video duration in seconds
+# Sampled frames whose mean absolute pixel difference (0-255, on a 64x64 grayscale thumbnail)
+# from the last kept frame is below this are skipped, but at least one frame is kept every FRAME_MIN_INTERVAL seconds
+FRAME_DIFF_THRESHOLD = float(os.getenv("FRAME_DIFF_THRESHOLD", "2.0"))
+FRAME_MIN_INTERVAL = 5.0
+MAX_FRAMES_PER_VIDEO = 50  # Maximum number of sampled frames sent to the VLM
+# VLM requests in flight at once. Ollama only serves them in parallel if the server is started with
+# OLLAMA_NUM_PARALLEL at least this high (e.g. OLLAMA_NUM_PARALLEL=4 ollama serve); otherwise they queue
+FRAME_ANALYSIS_CONCURRENCY = int(os.getenv("FRAME_ANALYSIS_CONCURRENCY", "4"))
+# Frames sent together in one VLM request. Keep at 1 for single-image models such as LLaVA;
+# raise to 4-8 for models that accept several images per message.
+FRAME_BATCH_SIZE = int(os.getenv("FRAME_BATCH_SIZE", "1"))
+# Decoded frames are grouped into micro-batches of up to this many frames before being sent to the VLM,
+# flushing early if no new frame arrives within the timeout (seconds)
+FRAME_MICRO_BATCH_SIZE = int(os.getenv("FRAME_MICRO_BATCH_SIZE", "8"))
+FRAME_MICRO_BATCH_TIMEOUT = 0.05
 
 # Agent Configuration
 AGENT_MEMORY_K = 10  # Number of past interactions to remember
+MAX_SESSIONS = 16  # Analyzed videos kept in memory by the API; the oldest finished ones are evicted first
 
 # API Configuration
 API_HOST = "0.0.0.0"
 API_PORT = 8000
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Bytes read per chunk when streaming uploads to disk
 
 # Frontend Configuration
 STREAMLIT_THEME = "dark"
@@ -2,27 +2,64 @@
 Utility functions for the Visual Understanding Chat Assistant.
 """
 
-import base64
-from datetime import timedelta
+import sys
+from functools import lru_cache
 import cv2
 import numpy as np
 
+try:
+    # SIMD base64 encoder that builds the str directly, skipping the bytes-to-str copy
+    from pybase64 import b64encode_as_string
+except ImportError:
+    from base64 import b64encode
+
+    def b64encode_as_string(data) -> str:
+        return b64encode(data).decode("ascii")
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbojpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    # PyTurboJPEG or the libjpeg-turbo shared library isn't installed; fall back to OpenCV's encoder
+    _turbojpeg = None
+
+JPEG_QUALITY = 85
+
+# dataclass(slots=True) needs Python 3.10+; older versions keep a per-instance __dict__
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 def format_timestamp(seconds: float) -> str:
     """Format timestamp as MM:SS"""
-    td = timedelta(seconds=seconds)
-    return str(td)[2:7]  # Remove hours, keep MM:SS
+    return _format_whole_seconds(int(seconds))
+
+
+@lru_cache(maxsize=4096)
+def _format_whole_seconds(seconds: int) -> str:
+    # Hours are dropped, matching the MM:SS display
+    return f"{seconds // 60 % 60:02d}:{seconds % 60:02d}"
 
 
 def frame_to_base64(frame: np.ndarray) -> str:
-    """Convert a numpy array frame to a base64 string for Ollama."""
-    # Convert BGR to RGB (OpenCV uses BGR by default)
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    
-    # Encode to JPEG
-    _, buffer = cv2.imencode(".jpg", frame_rgb, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    """Convert a BGR numpy array frame to a base64 JPEG string for Ollama."""
+    # Both encoders take OpenCV's BGR layout directly, so no color conversion copy is needed
+    if _turbojpeg is not None:
+        buffer = _turbojpeg.encode(frame, quality=JPEG_QUALITY, pixel_format=TJPF_BGR)
+    else:
+        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
     
     # Convert to base64
-    base64_string = base64.b64encode(buffer).decode("utf-8")
-    
-    return base64_string
+    return b64encode_as_string(buffer)
+
+
+def perceptual_hash(frame: np.ndarray) -> int:
+    """64-bit DCT perceptual hash of a frame; visually similar frames differ in only a few bits."""
+    # Downscale before converting to grayscale so the color conversion touches 32x32 pixels, not the full frame
+    small = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    small = small.astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8].flatten()
+    # Compare against the median of the AC terms; the DC term only tracks overall brightness
+    bits = low_freq > np.median(low_freq[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
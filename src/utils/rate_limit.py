@@ -0,0 +1,73 @@
+"""
+Client-side rate limiting for requests to the VLM server.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List
+
+# Rough prompt cost of one image for LLaVA-style models
+IMAGE_TOKENS = 576
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], num_predict: int) -> int:
+    """Rough token count of a chat request: ~4 characters per token, plus images and the response budget."""
+    chars = sum(len(message.get("content", "")) for message in messages)
+    images = sum(len(message.get("images", ())) for message in messages)
+    return chars // 4 + images * IMAGE_TOKENS + num_predict
+
+
+class TokenBucket:
+    """
+    Limits requests per minute and tokens per minute with two token buckets.
+    Each acquire reserves capacity immediately and then waits out any shortfall, so
+    concurrent callers are spaced out in arrival order. A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_tokens = float(rpm)
+        self.token_tokens = float(tpm)
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Takes capacity for one request and returns how many seconds to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.last_refill
+            self.last_refill = now
+
+            wait = 0.0
+            if self.rpm > 0:
+                self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60) - 1
+                if self.request_tokens < 0:
+                    wait = max(wait, -self.request_tokens * 60 / self.rpm)
+            if self.tpm > 0:
+                # A single request larger than the whole bucket still goes through once it is full
+                cost = min(estimated_tokens, self.tpm)
+                self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60) - cost
+                if self.token_tokens < 0:
+                    wait = max(wait, -self.token_tokens * 60 / self.tpm)
+            return wait
+
+    def acquire(self, estimated_tokens: int = 0):
+        """Blocks until a request of estimated_tokens may be sent."""
+        if not self.enabled:
+            return
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int = 0):
+        """Waits, without blocking the event loop, until a request of estimated_tokens may be sent."""
+        if not self.enabled:
+            return
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,53 @@
+"""
+Shared fixtures for the test suite.
+"""
+import json
+from pathlib import Path
+from unittest.mock import Mock
+import pytest
+# Import the application modules (and cv2, ollama, etc. behind them) once per worker at collection,
+# so test modules' own imports of them are plain sys.modules lookups
+import src.agents.chat_agent
+import src.agents.memory_manager
+from src.core.event_detector import EventDetector
+from src.core.summarizer import VideoSummarizer
+from src.core.video_processor import VideoProcessor
+from src.core.vlm_interface import VLMInterface
+
+
+@pytest.fixture(scope="session")
+def sample_video():
+    """Path to a committed 1 second, 160x120 black test video."""
+    return str(Path(__file__).parent / "fixtures" / "tiny.mp4")
+
+
+@pytest.fixture(scope="module")
+def video_processor():
+    """VideoProcessor with default settings, shared by the tests in a module."""
+    return VideoProcessor()
+
+
+@pytest.fixture(scope="module")
+def summarizer():
+    """VideoSummarizer whose LLM replies with a canned summary, shared by the tests in a module."""
+    vlm = Mock(spec=VLMInterface)
+    vlm.client = Mock()
+    vlm.client.chat.return_value = {'message': {'content': json.dumps({
+        "overview": "Test overview",
+        "highlights": ["Test highlight"]
+    })}}
+    return VideoSummarizer(vlm)
+
+
+@pytest.fixture(scope="module")
+def event_detector():
+    """EventDetector over a mock VLM, for tests that only exercise its parsing and classification."""
+    return EventDetector(Mock(spec=VLMInterface))
+
+
+@pytest.fixture
+def mock_ollama(monkeypatch):
+    """Mock Ollama client that VLMInterface connects to instead of a real server."""
+    client = Mock()
+    monkeypatch.setattr("src.core.vlm_interface.ollama.Client", lambda *args, **kwargs: client)
+    return client
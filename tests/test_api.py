@@ -0,0 +1,219 @@
+"""
+API tests for background video analysis and its session status.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import src.api.main as api
+from src.api.sessions import SessionLimitReached, SessionStore
+from src.core.video_processor import VideoProcessor, VideoFrame
+
+
+class FakeVLM:
+    """Stands in for VLMInterface; frame analysis waits until the test releases it."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.client = Mock()
+        self.client.chat.return_value = {'message': {'content': json.dumps({
+            "overview": "Someone waves at the camera.",
+            "highlights": ["Person waves"]
+        })}}
+
+    def is_available(self):
+        return True
+
+    def warm_up(self, prompt):
+        return True
+
+    async def analyze_frames_batch(self, items):
+        while not self.release.is_set():
+            await asyncio.sleep(0.01)
+        return ["ACTION_EVENT|Person waves|medium|person_1" for _ in items]
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def fake_vlm(monkeypatch):
+    vlm = FakeVLM()
+    monkeypatch.setattr(api, "VLMInterface", lambda: vlm)
+    return vlm
+
+
+@pytest.fixture
+def client(fake_vlm):
+    with TestClient(api.app) as client:
+        yield client
+
+
+def upload(client, sample_video):
+    with open(sample_video, "rb") as f:
+        response = client.post("/upload_video", files={"file": ("tiny.mp4", f, "video/mp4")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def wait_for_status(client, session_id, status, timeout=10.0):
+    """Poll /status/{session_id} until the analysis reaches status."""
+    deadline = time.monotonic() + timeout
+    while True:
+        body = client.get(f"/status/{session_id}").json()
+        if body["analysis_status"] == status or time.monotonic() > deadline:
+            return body
+        time.sleep(0.02)
+
+
+def test_upload_is_analyzed_in_background(client, fake_vlm, sample_video):
+    """Test that an upload reports processing, then completed with its analysis available."""
+    uploaded = upload(client, sample_video)
+    assert uploaded["status"] == "processing"
+    session_id = uploaded["session_id"]
+
+    status = client.get(f"/status/{session_id}").json()
+    assert status["analysis_status"] == "processing"
+    assert status["video_loaded"] is False
+    assert client.get("/analysis", params={"session_id": session_id}).status_code == 409
+
+    fake_vlm.release.set()
+    status = wait_for_status(client, session_id, "completed")
+
+    assert status["analysis_status"] == "completed"
+    assert status["progress"] == 1.0
+    assert status["events_count"] == 1
+    assert status["error"] is None
+    analysis = client.get("/analysis", params={"session_id": session_id}).json()
+    assert analysis["overview"] == "Someone waves at the camera."
+
+
+def test_summarizers_share_the_app_prompt_cache(client, fake_vlm, sample_video, monkeypatch):
+    """Test that every upload's summarizer uses the one PromptCache opened at startup."""
+    caches = []
+    real_init = api.VideoSummarizer.__init__
+
+    def recording_init(self, *args, **kwargs):
+        real_init(self, *args, **kwargs)
+        caches.append(self.cache)
+
+    monkeypatch.setattr(api.VideoSummarizer, "__init__", recording_init)
+    fake_vlm.release.set()
+    for _ in range(2):
+        wait_for_status(client, upload(client, sample_video)["session_id"], "completed")
+
+    assert caches == [api.app.state.prompt_cache] * 2
+
+
+def test_analysis_failure_is_reported(client, fake_vlm, sample_video, monkeypatch):
+    """Test that an error during analysis marks the session failed with the error message."""
+    def broken_extract_frames(self, video_path):
+        raise RuntimeError("decoder crashed")
+        yield
+
+    monkeypatch.setattr(VideoProcessor, "extract_frames", broken_extract_frames)
+    fake_vlm.release.set()
+    session_id = upload(client, sample_video)["session_id"]
+
+    status = wait_for_status(client, session_id, "failed")
+
+    assert status["analysis_status"] == "failed"
+    assert status["error"] == "decoder crashed"
+    response = client.get("/analysis", params={"session_id": session_id})
+    assert response.status_code == 409
+    assert "decoder crashed" in response.json()["detail"]
+
+
+def test_unknown_session_is_404(client):
+    """Test that status and analysis lookups for an unknown session return 404."""
+    assert client.get("/status/not-a-session").status_code == 404
+    assert client.get("/analysis", params={"session_id": "not-a-session"}).status_code == 404
+
+
+def test_eviction_skips_sessions_still_processing():
+    """Test that a full store evicts the oldest finished session and refuses when none has finished."""
+    store = SessionStore(max_sessions=2)
+    running_id, running = store.create()
+    finished_id, finished = store.create()
+    finished.status = "failed"
+
+    new_id, _ = store.create()
+    assert store.get(running_id) is running
+    assert store.get(finished_id) is None
+    assert store.get(new_id) is not None
+
+    with pytest.raises(SessionLimitReached):
+        store.create()
+    assert len(store) == 2
+
+
+def test_upload_rejected_while_all_sessions_busy(client, fake_vlm, sample_video, monkeypatch):
+    """Test that uploads get a 503 while every session slot is analyzing, and are accepted once one finishes."""
+    monkeypatch.setattr(api, "sessions", SessionStore(max_sessions=1))
+    session_id = upload(client, sample_video)["session_id"]
+
+    with open(sample_video, "rb") as f:
+        response = client.post("/upload_video", files={"file": ("tiny.mp4", f, "video/mp4")})
+    assert response.status_code == 503
+    assert client.get(f"/status/{session_id}").json()["analysis_status"] == "processing"
+
+    fake_vlm.release.set()
+    wait_for_status(client, session_id, "completed")
+    upload(client, sample_video)
+    assert client.get(f"/status/{session_id}").status_code == 404
+
+
+def test_detect_events_keeps_frame_order():
+    """Test that micro-batch results come back in frame order even when later batches finish first."""
+    frames = [VideoFrame(np.zeros((4, 4, 3), dtype=np.uint8), float(i), i) for i in range(10)]
+    progress = []
+    completed = []
+
+    class OutOfOrderDetector:
+        async def detect_events_in_frames(self, batch, images_per_request):
+            # Earlier batches take longer, so batches complete in reverse order
+            await asyncio.sleep(0.05 * (10 - batch[0].frame_number) / 10)
+            completed.append(batch[0].frame_number)
+            return [f"event {frame.frame_number}" for frame in batch]
+
+    events = asyncio.run(api.detect_events(
+        OutOfOrderDetector(), iter(frames), batch_size=3, batch_timeout=0.01, on_progress=progress.append
+    ))
+
+    assert completed != sorted(completed)
+    assert events == [f"event {i}" for i in range(10)]
+    assert sum(progress) == 10
+
+
+def test_cancelled_detection_releases_producer():
+    """Test that cancelling detection unblocks the decode thread waiting on the full frame queue."""
+    def endless_frames():
+        for i in itertools.count():
+            yield VideoFrame(np.zeros((4, 4, 3), dtype=np.uint8), float(i), i)
+
+    class StuckDetector:
+        async def detect_events_in_frames(self, batch, images_per_request):
+            await asyncio.Event().wait()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        task = asyncio.create_task(api.detect_events(
+            StuckDetector(), endless_frames(), batch_size=2, batch_timeout=0.01, executor=executor
+        ))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # The producer returns once it notices the consumer stopped, freeing the executor's only thread
+    assert executor.submit(lambda: "free").result(timeout=2) == "free"
+    executor.shutdown()
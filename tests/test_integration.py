@@ -1,18 +1,12 @@
 """
 Integration tests for the Visual Understanding Chat Assistant.
 """
+import itertools
 import pytest
-import tempfile
-import os
-import cv2
 import numpy as np
-from unittest.mock import Mock, patch
-import sys
-import os
-
-# Add src to path for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from unittest.mock import MagicMock, Mock
 
+import src.core.video_processor as video_processor_module
 from src.core.video_processor import VideoProcessor, VideoFrame
 from src.core.vlm_interface import VLMInterface
 from src.core.event_detector import EventDetector, DetectedEvent, EventType
@@ -30,76 +24,93 @@ class TestVideoProcessor:
         processor = VideoProcessor()
         assert processor.fps_sample_rate == FPS_SAMPLE_RATE
     
-    def test_create_test_video(self):
-        """Create a test video for testing."""
-        # Create a simple test video
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter('test_video.mp4', fourcc, 20.0, (640, 480))
-        
-        for i in range(60):  # 3 seconds at 20fps
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            # Add some content to make it interesting
-            cv2.rectangle(frame, (100, 100), (300, 200), (0, 255, 0), 2)
-            cv2.putText(frame, f'Frame {i}', (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            out.write(frame)
-        
-        out.release()
-        return 'test_video.mp4'
-    
-    def test_video_validation(self):
+    def test_video_validation(self, video_processor, sample_video):
         """Test video validation functionality."""
-        processor = VideoProcessor()
-        
         # Test with valid video
-        test_video = self.test_create_test_video()
-        validation = processor.validate_video(test_video)
+        validation = video_processor.validate_video(sample_video)
         
         assert validation["valid"] == True
         assert validation["duration"] <= MAX_VIDEO_DURATION
         assert validation["fps"] > 0
         assert validation["frame_count"] > 0
-        
-        # Clean up
-        os.remove(test_video)
     
-    def test_frame_extraction(self):
+    def test_frame_extraction(self, video_processor, sample_video):
         """Test frame extraction functionality."""
-        processor = VideoProcessor()
-        test_video = self.test_create_test_video()
-        
-        frames = list(processor.extract_frames(test_video))
+        # A few frames are enough to check their structure without decoding the whole clip
+        frames = list(itertools.islice(video_processor.extract_frames(sample_video), 3))
         
         assert len(frames) > 0
         assert all(isinstance(frame, VideoFrame) for frame in frames)
         assert all(hasattr(frame, 'frame') for frame in frames)
         assert all(hasattr(frame, 'timestamp') for frame in frames)
         assert all(hasattr(frame, 'frame_number') for frame in frames)
+    
+    def test_static_frames_are_skipped(self, sample_video):
+        """Test that sampled frames identical to the last kept one are dropped from a static video."""
+        processor = VideoProcessor(fps_sample_rate=10)
+        
+        frames = list(processor.extract_frames(sample_video))
         
-        # Clean up
-        os.remove(test_video)
+        assert [frame.timestamp for frame in frames] == [0.0]
+    
+    def test_scene_change_is_kept(self, monkeypatch):
+        """Test that the change gate keeps scene changes and a periodic frame of a static scene."""
+        processor = VideoProcessor(diff_threshold=2.0, min_interval=5.0)
+        black = np.zeros((120, 160, 3), dtype=np.uint8)
+        white = np.full((120, 160, 3), 255, dtype=np.uint8)
+        sampled = [(black, 0.0, 0), (black, 1.0, 20), (black, 2.0, 40), (white, 3.0, 60), (white, 4.0, 80),
+                   (white, 10.0, 200)]
+        monkeypatch.setattr(processor, "_sampled_frames", lambda video_path: iter(sampled))
+        
+        frames = list(processor.extract_frames("unused.mp4"))
+        
+        assert [frame.timestamp for frame in frames] == [0.0, 3.0, 10.0]
+    
+    @pytest.mark.skipif(video_processor_module.av is None, reason="PyAV is not installed")
+    def test_decoders_sample_the_same_frames(self, sample_video):
+        """Test that the PyAV and OpenCV decoders sample the same frames at the same timestamps."""
+        processor = VideoProcessor(fps_sample_rate=10)
+        
+        av_frames = [(timestamp, number) for _, timestamp, number in processor._sampled_frames_av(sample_video)]
+        cv2_frames = [(timestamp, number) for _, timestamp, number in processor._sampled_frames_cv2(sample_video)]
+        
+        assert len(av_frames) == 10
+        assert [number for _, number in av_frames] == [number for _, number in cv2_frames]
+        assert [timestamp for timestamp, _ in av_frames] == pytest.approx([timestamp for timestamp, _ in cv2_frames])
+
+    
+    @pytest.mark.skipif(video_processor_module.av is None, reason="PyAV is not installed")
+    def test_stream_without_frame_rate_falls_back_to_opencv(self, sample_video, monkeypatch):
+        """Test that a stream with no frame rate is sampled through OpenCV instead of dividing by zero."""
+        processor = VideoProcessor(fps_sample_rate=10)
+        container = MagicMock()
+        container.__enter__.return_value = container
+        container.streams.video = [Mock(average_rate=None, guessed_rate=None)]
+        monkeypatch.setattr(video_processor_module.av, "open", lambda path: container)
+        
+        sampled = [(timestamp, number) for _, timestamp, number in processor._sampled_frames_av(sample_video)]
+        
+        container.decode.assert_not_called()
+        assert sampled == [(timestamp, number) for _, timestamp, number in processor._sampled_frames_cv2(sample_video)]
+        assert len(sampled) > 1
 
 
 class TestVLMInterface:
     """Test VLM interface functionality."""
     
-    @patch('src.core.vlm_interface.ollama.Client')
-    def test_vlm_initialization(self, mock_client):
+    def test_vlm_initialization(self, mock_ollama):
         """Test VLM interface initialization."""
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        
         vlm = VLMInterface()
         assert vlm.model_name == "llava:7b"
-        assert vlm.client == mock_client_instance
+        assert vlm.client == mock_ollama
     
-    @patch('src.core.vlm_interface.ollama.Client')
-    def test_analyze_frame(self, mock_client):
+    def test_analyze_frame(self, mock_ollama):
         """Test frame analysis functionality."""
-        mock_client_instance = Mock()
-        mock_client_instance.chat.return_value = {
-            'message': {'content': 'Test response'}
-        }
-        mock_client.return_value = mock_client_instance
+        # Frame analysis streams the response in chunks
+        mock_ollama.chat.return_value = iter([
+            {'message': {'content': 'Test '}},
+            {'message': {'content': 'response'}}
+        ])
         
         vlm = VLMInterface()
         
@@ -108,7 +119,15 @@ class TestVLMInterface:
         response = vlm.analyze_frame(test_frame, "Test prompt")
         
         assert response == "Test response"
-        mock_client_instance.chat.assert_called_once()
+        mock_ollama.chat.assert_called_once()
+    
+    def test_is_available_probes_without_generating(self, mock_ollama):
+        """Test that the availability check asks for model info instead of running a chat."""
+        vlm = VLMInterface()
+        
+        assert vlm.is_available()
+        mock_ollama.show.assert_called_once_with(vlm.model_name)
+        mock_ollama.chat.assert_not_called()
 
 
 class TestEventDetector:
@@ -116,49 +135,82 @@ class TestEventDetector:
     
     def test_event_detector_initialization(self):
         """Test EventDetector initialization."""
-        mock_vlm = Mock()
+        mock_vlm = Mock(spec=VLMInterface)
         detector = EventDetector(mock_vlm)
         
         assert detector.vlm == mock_vlm
         assert "general" in detector.detection_prompts
     
-    def test_event_classification(self):
+    @pytest.mark.parametrize("phrase,expected", [
+        ("person performing an action", EventType.ACTION_EVENT),
+        ("motion near the door", EventType.ACTION_EVENT),
+        ("two people interacting", EventType.INTERACTION_EVENT),
+        ("handshake between players", EventType.INTERACTION_EVENT),
+        ("camera pans to a new scene", EventType.SCENE_CHANGE),
+        ("transition to another location", EventType.SCENE_CHANGE),
+        ("ongoing process", EventType.ACTIVITY_EVENT),
+        ("object on the table", EventType.OBJECT_EVENT),
+        ("unattended item", EventType.OBJECT_EVENT),
+        ("quiet street", EventType.UNKNOWN),
+    ])
+    def test_event_classification(self, event_detector, phrase, expected):
         """Test event type classification."""
-        mock_vlm = Mock()
-        detector = EventDetector(mock_vlm)
-        
-        # Test traffic violation classification
-        assert detector._classify_event_type("red light violation") == EventType.TRAFFIC_VIOLATION
-        assert detector._classify_event_type("wrong way driving") == EventType.TRAFFIC_VIOLATION
-        
-        # Test pedestrian event classification
-        assert detector._classify_event_type("pedestrian crossing") == EventType.PEDESTRIAN_EVENT
-        assert detector._classify_event_type("jaywalking") == EventType.PEDESTRIAN_EVENT
-        
-        # Test vehicle event classification
-        assert detector._classify_event_type("vehicle turning") == EventType.VEHICLE_EVENT
-        assert detector._classify_event_type("car parking") == EventType.VEHICLE_EVENT
+        assert event_detector._classify_event_type(phrase) == expected
     
-    def test_parse_event_response(self):
+    def test_parse_event_response(self, event_detector):
         """Test parsing of VLM responses into events."""
-        mock_vlm = Mock()
-        detector = EventDetector(mock_vlm)
-        
         # Test parsing valid response
-        response = "TRAFFIC_VIOLATION|Red light running|high|car_1,traffic_light_1"
-        events = detector._parse_event_response(response, 10.5, 210)
+        response = "ACTION_EVENT|Person running across the room|high|person_1,door_1"
+        events = event_detector._parse_event_response(response, 10.5, 210)
         
         assert len(events) == 1
         assert events[0].timestamp == 10.5
-        assert events[0].event_type == EventType.TRAFFIC_VIOLATION
-        assert events[0].description == "Red light running"
+        assert events[0].event_type == EventType.ACTION_EVENT
+        assert events[0].description == "Person running across the room"
         assert events[0].severity == "high"
-        assert events[0].objects_involved == ["car_1", "traffic_light_1"]
+        assert events[0].objects_involved == ("person_1", "door_1")
+        assert events[0].frame_number == 210
+        assert events[0].to_dict()["objects"] == ["person_1", "door_1"]
+        assert len({events[0], event_detector._parse_event_response(response, 10.5, 210)[0]}) == 1
         
         # Test parsing NONE response
         none_response = "NONE"
-        events = detector._parse_event_response(none_response, 10.5, 210)
+        events = event_detector._parse_event_response(none_response, 10.5, 210)
         assert len(events) == 0
+    
+    @pytest.mark.parametrize("response", [
+        "not json",
+        '["frames"]',
+        '{"events": []}',
+        '{"frames": {"events": []}}',
+        '{"frames": [{"events": []}]}',
+        '{"frames": [{"events": []}, {"events": []}, {"events": []}]}',
+    ])
+    def test_parse_batch_response_rejects_mismatched_reply(self, event_detector, response):
+        """Test that malformed, short and over-long batch replies are rejected."""
+        video_frames = [VideoFrame(np.zeros((4, 4, 3), dtype=np.uint8), float(i), i * 20) for i in range(2)]
+        assert event_detector._parse_batch_response(response, video_frames) is None
+    
+    def test_parse_batch_response(self, event_detector):
+        """Test that batch reply entries map onto their frames in order."""
+        video_frames = [VideoFrame(np.zeros((4, 4, 3), dtype=np.uint8), float(i), i * 20) for i in range(2)]
+        response = (
+            '{"frames": ['
+            '{"events": [{"type": "ACTION_EVENT", "description": "Person jumps", "severity": "High",'
+            ' "objects": ["person_1"]}, "junk", {"type": "OBJECT_EVENT", "description": ""}]},'
+            '{"events": [{"type": "object", "description": "Box left behind", "severity": "low",'
+            ' "objects": "box_1, table_1"}]}'
+            ']}'
+        )
+        
+        events = event_detector._parse_batch_response(response, video_frames)
+        
+        assert [event.timestamp for event in events] == [0.0, 1.0]
+        assert [event.frame_number for event in events] == [0, 20]
+        assert events[0].event_type == EventType.ACTION_EVENT
+        assert events[0].severity == "high"
+        assert events[1].event_type == EventType.OBJECT_EVENT
+        assert events[1].objects_involved == ("box_1", "table_1")
 
 
 class TestVideoSummarizer:
@@ -169,41 +221,70 @@ class TestVideoSummarizer:
         summarizer = VideoSummarizer()
         assert summarizer is not None
     
-    def test_generate_summary(self):
+    def test_generate_summary(self, summarizer):
         """Test summary generation."""
-        summarizer = VideoSummarizer()
-        
         # Create test events
         events = [
             DetectedEvent(
                 timestamp=10.0,
-                event_type=EventType.TRAFFIC_VIOLATION,
-                subtype="red_light_running",
-                description="Car ran red light",
+                event_type=EventType.ACTION_EVENT,
+                subtype="movement",
+                description="Person running across the room",
                 severity="high",
                 confidence=0.9,
-                objects_involved=["car_1", "traffic_light_1"],
+                objects_involved=("person_1",),
                 frame_number=200
             ),
             DetectedEvent(
                 timestamp=15.0,
-                event_type=EventType.PEDESTRIAN_EVENT,
-                subtype="crossing",
-                description="Pedestrian crossing street",
+                event_type=EventType.OBJECT_EVENT,
+                subtype="object_detected",
+                description="Bag left on the table",
                 severity="medium",
                 confidence=0.8,
-                objects_involved=["pedestrian_1"],
+                objects_involved=("bag_1", "table_1"),
                 frame_number=300
             )
         ]
         
         summary = summarizer.generate_summary(events, 60.0)
         
-        assert "overview" in summary
-        assert "violations" in summary
+        assert summary["overview"] == "Test overview"
+        assert summary["key_highlights"] == ["Test highlight"]
         assert "timeline" in summary
-        assert len(summary["violations"]) == 1
+        assert set(summary["events_by_type"]) == {"action_event", "object_event"}
         assert len(summary["timeline"]) == 2
+        assert summary["statistics"]["total_events"] == 2
+    
+    @pytest.mark.parametrize("content", [
+        '{"overview": "A short clip.", "highlights": "just one string"}',
+        '{"overview": ["not", "a", "string"], "highlights": ["Someone waves"]}',
+        '["overview", "highlights"]',
+        'not json at all',
+    ])
+    def test_malformed_summary_response_falls_back(self, content):
+        """Test that a wrongly shaped JSON reply falls back to the basic overview and highlights."""
+        mock_vlm = Mock(spec=VLMInterface)
+        mock_vlm.client = Mock()
+        mock_vlm.client.chat.return_value = {'message': {'content': content}}
+        summarizer = VideoSummarizer(mock_vlm)
+        events = [
+            DetectedEvent(
+                timestamp=5.0,
+                event_type=EventType.ACTION_EVENT,
+                subtype="movement",
+                description="Person waves at the camera",
+                severity="medium",
+                confidence=0.8,
+                objects_involved=("person_1",),
+                frame_number=100
+            )
+        ]
+        
+        overview, highlights = summarizer._generate_overview_and_highlights(events, 30.0)
+        
+        assert overview == summarizer._generate_basic_overview(events, 30.0)
+        assert highlights == summarizer._generate_basic_highlights(events)
 
 
 class TestMemoryManager:
@@ -213,7 +294,7 @@ class TestMemoryManager:
         """Test MemoryManager initialization."""
         memory = MemoryManager()
         assert memory.k == 10
-        assert memory.history == []
+        assert list(memory.history) == []
     
     def test_add_message(self):
         """Test adding messages to memory."""
@@ -255,7 +336,7 @@ class TestVideoAnalysisAgent:
     
     def test_agent_initialization(self):
         """Test VideoAnalysisAgent initialization."""
-        mock_vlm = Mock()
+        mock_vlm = Mock(spec=VLMInterface)
         events = []
         summary = {"overview": "Test summary"}
         
@@ -269,7 +350,7 @@ class TestVideoAnalysisAgent:
     
     def test_create_initial_context(self):
         """Test initial context creation."""
-        mock_vlm = Mock()
+        mock_vlm = Mock(spec=VLMInterface)
         events = []
         summary = {
             "overview": "Test overview",
@@ -287,12 +368,10 @@ class TestVideoAnalysisAgent:
         assert "Test overview" in context
         assert "Red light violation" in context
     
-    @patch('src.agents.chat_agent.VLMInterface')
-    def test_chat_functionality(self, mock_vlm_class):
+    def test_chat_functionality(self):
         """Test chat functionality."""
-        mock_vlm = Mock()
+        mock_vlm = Mock(spec=VLMInterface)
         mock_vlm.chat_with_context.return_value = "Test response"
-        mock_vlm_class.return_value = mock_vlm
         
         events = []
         summary = {"overview": "Test summary"}
@@ -307,64 +386,41 @@ class TestVideoAnalysisAgent:
 class TestEndToEnd:
     """End-to-end integration tests."""
     
-    @patch('src.core.vlm_interface.ollama.Client')
-    def test_full_pipeline(self, mock_client):
+    @pytest.mark.slow
+    def test_full_pipeline(self, mock_ollama, video_processor, summarizer, sample_video):
         """Test the complete pipeline from video to chat."""
         # Mock VLM responses
-        mock_client_instance = Mock()
-        mock_client_instance.chat.return_value = {
-            'message': {'content': 'TRAFFIC_VIOLATION|Red light running|high|car_1,traffic_light_1'}
-        }
-        mock_client.return_value = mock_client_instance
+        def chat(**kwargs):
+            message = {'message': {'content': 'TRAFFIC_VIOLATION|Red light running|high|car_1,traffic_light_1'}}
+            # Frame analysis streams the response in chunks
+            return iter([message]) if kwargs.get('stream') else message
         
-        # Create test video
-        processor = VideoProcessor()
-        test_video = self.create_test_video()
-        
-        try:
-            # Test video processing
-            validation = processor.validate_video(test_video)
-            assert validation["valid"] == True
-            
-            frames = list(processor.extract_frames(test_video))
-            assert len(frames) > 0
-            
-            # Test VLM interface
-            vlm = VLMInterface()
-            
-            # Test event detection
-            detector = EventDetector(vlm)
-            events = detector.detect_events_in_frame(frames[0])
-            assert len(events) >= 0  # May be 0 if no events detected
-            
-            # Test summarization
-            summarizer = VideoSummarizer()
-            summary = summarizer.generate_summary(events, validation["duration"])
-            assert "overview" in summary
-            
-            # Test chat agent
-            agent = VideoAnalysisAgent(events, summary, vlm)
-            response = agent.chat("What happened in the video?")
-            assert isinstance(response, str)
-            
-        finally:
-            # Clean up
-            if os.path.exists(test_video):
-                os.remove(test_video)
-    
-    def create_test_video(self):
-        """Create a test video for integration testing."""
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter('test_integration.mp4', fourcc, 20.0, (640, 480))
-        
-        for i in range(40):  # 2 seconds at 20fps
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.rectangle(frame, (100, 100), (300, 200), (0, 255, 0), 2)
-            cv2.putText(frame, f'Test Frame {i}', (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            out.write(frame)
-        
-        out.release()
-        return 'test_integration.mp4'
+        mock_ollama.chat.side_effect = chat
+        
+        # Test video processing
+        validation = video_processor.validate_video(sample_video)
+        assert validation["valid"] == True
+        
+        # Only the first frame goes through event detection
+        frames = list(itertools.islice(video_processor.extract_frames(sample_video), 1))
+        assert len(frames) > 0
+        
+        # Test VLM interface
+        vlm = VLMInterface()
+        
+        # Test event detection
+        detector = EventDetector(vlm)
+        events = detector.detect_events_in_frame(frames[0])
+        assert len(events) >= 0  # May be 0 if no events detected
+        
+        # Test summarization
+        summary = summarizer.generate_summary(events, validation["duration"])
+        assert "overview" in summary
+        
+        # Test chat agent
+        agent = VideoAnalysisAgent(events, summary, vlm)
+        response = agent.chat("What happened in the video?")
+        assert isinstance(response, str)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+"""
+Tests for the client-side VLM rate limiter.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+
+from src.utils import rate_limit
+from src.utils.rate_limit import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the limiter's clock with a manual one; sleeps are recorded instead of taken."""
+    fake = SimpleNamespace(now=0.0, sleeps=[])
+    fake.monotonic = lambda: fake.now
+    fake.sleep = fake.sleeps.append
+    monkeypatch.setattr(rate_limit, "time", fake)
+    return fake
+
+
+def test_disabled_without_limits(clock):
+    """Test that a bucket with no limits never waits."""
+    bucket = TokenBucket()
+    assert not bucket.enabled
+    for _ in range(100):
+        bucket.acquire(10_000)
+    assert clock.sleeps == []
+
+
+def test_requests_per_minute_refill(clock):
+    """Test that requests beyond the per-minute budget wait, and the bucket refills over time."""
+    bucket = TokenBucket(rpm=2)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+    # A minute later the debt is repaid and one request's worth has refilled
+    clock.now += 60
+    bucket.acquire()
+    assert len(clock.sleeps) == 1
+
+
+def test_tokens_per_minute_waits_for_debt(clock):
+    """Test that the token budget delays requests by the time needed to refill their cost."""
+    bucket = TokenBucket(tpm=600)
+    bucket.acquire(600)
+    bucket.acquire(100)
+    assert clock.sleeps == [pytest.approx(10.0)]
+
+
+def test_request_larger_than_capacity(clock):
+    """Test that a request costing more than the whole bucket still goes through when it is full."""
+    bucket = TokenBucket(tpm=100)
+    bucket.acquire(500)
+    assert clock.sleeps == []
+
+    bucket.acquire(10)
+    assert clock.sleeps == [pytest.approx(6.0)]
+
+
+def test_acquire_async_does_not_block_loop(monkeypatch):
+    """Test that waiting for capacity yields to other tasks instead of sleeping the thread."""
+    def blocking_sleep(seconds):
+        raise AssertionError("acquire_async must not call time.sleep")
+
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=time.monotonic, sleep=blocking_sleep))
+    bucket = TokenBucket(rpm=600)
+    bucket.request_tokens = 0  # Empty, so the next request waits about 0.1s
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        await bucket.acquire_async()
+        ticker_task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 3
@@ -0,0 +1,123 @@
+"""
+Tests for the VLM response caches.
+"""
+import numpy as np
+import pytest
+
+from src.core.vlm_cache import CacheKey, PromptCache, ResponseCache, prompt_key
+from src.core.vlm_interface import REPLAY_MISS_RESPONSE, VLMInterface
+
+
+def make_frame(seed=0):
+    """A 64x64 BGR frame with coarse structure, so its perceptual hash is stable."""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((8, 8, 1), dtype=np.uint8))
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "vlm_cache.sqlite3")
+
+
+def test_nearest_frame_within_hamming_distance(cache_path):
+    """Test that lookups match stored frames up to max_distance differing hash bits."""
+    cache = ResponseCache(cache_path, mode="enabled", max_distance=4)
+    key = prompt_key("prompt", "model")
+    cache.put(CacheKey(key, 0b1010_0000), "stored")
+
+    assert cache.get(CacheKey(key, 0b1010_0000)) == "stored"
+    assert cache.get(CacheKey(key, 0b1010_1111)) == "stored"  # 4 bits differ
+    assert cache.get(CacheKey(key, 0b1011_1111)) is None  # 5 bits differ
+    assert cache.get(CacheKey(prompt_key("other prompt", "model"), 0b1010_0000)) is None
+
+
+def test_closest_frame_wins(cache_path):
+    """Test that the stored frame with the fewest differing bits is returned."""
+    cache = ResponseCache(cache_path, mode="enabled", max_distance=4)
+    key = prompt_key("prompt", "model")
+    cache.put(CacheKey(key, 0b0000), "far")
+    cache.put(CacheKey(key, 0b0111), "near")
+
+    assert cache.get(CacheKey(key, 0b1111)) == "near"
+
+
+def test_lookup_matches_near_identical_frames(cache_path):
+    """Test that a slightly noisy copy of a frame reuses the stored response."""
+    cache = ResponseCache(cache_path, mode="enabled")
+    frame = make_frame()
+    key, cached = cache.lookup(frame, "prompt", "model")
+    assert cached is None
+    cache.put(key, "stored")
+
+    noisy = np.clip(frame.astype(np.int16) + np.random.default_rng(1).integers(-3, 4, frame.shape), 0, 255)
+    assert cache.lookup(noisy.astype(np.uint8), "prompt", "model")[1] == "stored"
+    assert cache.lookup(make_frame(seed=2), "prompt", "model")[1] is None
+
+
+def test_cache_modes(cache_path):
+    """Test which modes read and write the shared store."""
+    key = CacheKey(prompt_key("prompt", "model"), 42)
+
+    write_only = ResponseCache(cache_path, mode="write-only")
+    write_only.put(key, "recorded")
+    assert write_only.get(key) is None
+
+    replay = ResponseCache(cache_path, mode="replay")
+    assert replay.get(key) == "recorded"
+    replay.put(CacheKey(key.prompt_key, 7), "ignored")
+    assert ResponseCache(cache_path, mode="enabled", max_distance=0).get(CacheKey(key.prompt_key, 7)) is None
+
+    disabled = ResponseCache(cache_path, mode="disabled")
+    assert not disabled.active
+    assert disabled.key(make_frame(), "prompt", "model") is None
+    assert disabled.get(key) is None
+
+    with pytest.raises(ValueError):
+        ResponseCache(cache_path, mode="sometimes")
+
+
+def test_replay_miss_skips_the_vlm(cache_path, mock_ollama):
+    """Test that in replay mode an uncached frame returns REPLAY_MISS_RESPONSE without calling the VLM."""
+    vlm = VLMInterface()
+    vlm.cache = ResponseCache(cache_path, mode="replay")
+
+    assert vlm.analyze_frame(make_frame(), "prompt") == REPLAY_MISS_RESPONSE
+    mock_ollama.chat.assert_not_called()
+
+
+def test_replay_hit_returns_recorded_response(cache_path, mock_ollama):
+    """Test that a response recorded for a frame is replayed without calling the VLM."""
+    frame = make_frame()
+    vlm = VLMInterface()
+    recorder = ResponseCache(cache_path, mode="write-only")
+    recorder.put(recorder.key(frame, "prompt", vlm.model_name), "ACTION_EVENT|Recorded|low|")
+
+    vlm.cache = ResponseCache(cache_path, mode="replay")
+
+    assert vlm.analyze_frame(frame, "prompt") == "ACTION_EVENT|Recorded|low|"
+    mock_ollama.chat.assert_not_called()
+
+
+def test_prompt_cache_hit_and_miss(cache_path):
+    """Test that text prompts hit only on the exact prompt and model."""
+    cache = PromptCache(cache_path, mode="enabled")
+    key = cache.key("Summarize these events", "llama2:7b")
+    assert cache.get(key) is None
+
+    cache.put(key, '{"overview": "..."}')
+
+    assert cache.get(key) == '{"overview": "..."}'
+    assert cache.get(cache.key("Summarize these events.", "llama2:7b")) is None
+    assert cache.get(cache.key("Summarize these events", "mistral:7b")) is None
+    assert PromptCache(cache_path, mode="disabled").key("Summarize these events", "llama2:7b") is None
+
+
+def test_closed_prompt_cache_stops_caching(cache_path):
+    """Test that closing a cache releases its connection and later keys are None."""
+    cache = PromptCache(cache_path, mode="enabled")
+    cache.close()
+
+    assert not cache.active
+    assert cache.key("Summarize these events", "llama2:7b") is None
+    cache.close()